@@ -1,8 +1,13 @@
 import hashlib
 import time
 import os
+import sys
 import matplotlib.pyplot as plt
 
+# Módulo de hash compartido por los sincronizadores del proyecto final
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Proyecto Final", "src", "Compartido"))
+import hashing
+
 BLOCK_SIZE = 1 * 1024 
 
 # --- Algoritmos ---
@@ -24,6 +29,10 @@ def calc_sha256_full(path):
         h.update(f.read())
     return h.hexdigest()
 
+def calc_sha256_adaptive(path):
+    """Algoritmo 3: Bloque adaptativo con readinto sobre un buffer reutilizado (mmap en archivos grandes)"""
+    return hashing.calc_sha256(path)
+
 # --- Función para medir tiempo ---
 def measure_time(func, path):
     start = time.time()
@@ -44,14 +53,23 @@ for size in file_sizes:
 # --- Medir tiempos ---
 times_block = []
 times_full = []
+times_adaptive = []
+throughputs_adaptive = []
 
 for file in file_names:
     times_block.append(measure_time(calc_sha256_block, file))
     times_full.append(measure_time(calc_sha256_full, file))
+    hashing.reset_hash_stats()
+    times_adaptive.append(measure_time(calc_sha256_adaptive, file))
+    throughputs_adaptive.append(hashing.hash_throughput())
+
+for size, bps in zip(file_sizes, throughputs_adaptive):
+    print(f"Adaptativo {size} bytes: {bps / (1024 * 1024):.1f} MB/s")
 
 # --- Graficar ---
 plt.plot(file_sizes, times_block, marker='o', label="Por bloques (4KB)")
 plt.plot(file_sizes, times_full, marker='x', label="Todo de una vez")
+plt.plot(file_sizes, times_adaptive, marker='s', label="Bloque adaptativo (readinto/mmap)")
 plt.xlabel("Tamaño de archivo (bytes)")
 plt.ylabel("Tiempo de ejecución (s)")
 plt.title("Comparativa temporal de algoritmos SHA256")
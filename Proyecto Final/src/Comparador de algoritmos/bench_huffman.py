@@ -0,0 +1,186 @@
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import tempfile
+import tracemalloc
+from collections import Counter
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Técnica voraz"))
+import huffman
+
+SNAPSHOT_ENTRIES = [1000, 100_000, 1_000_000]  # archivos en los snapshots de prueba
+CORPUS_SIZE = 8 * 1024 * 1024  # 8 MB para texto, bytes aleatorios y alfabeto sesgado
+REPORT_FILE = "huffman_benchmark.json"
+WORDS = ("the of and to a in is it you that he was for on are with as his they be at one have this from or had by "
+         "word but what some we can out other were all there when up use your how said an each she which do their "
+         "time if will way about many then them write would like so these her long make thing see him two has look "
+         "more day could go come did number sound no most people my over know water than call first who may down "
+         "side been now find any new work part take get place made live where after back little only round man year").split()
+
+# --- Corpus de prueba ---
+def snapshot_json(entries): #Snapshot como el del servidor: rutas con carpetas repetidas y sha256 en hexadecimal
+    rng = random.Random(entries)
+    snapshot = {f"carpeta_{i % 100}/sub_{i % 7}/archivo_{i}.txt": "%064x" % rng.getrandbits(256) for i in range(entries)}
+    return json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def english_text(size): #Texto en inglés sintético: palabras comunes con frecuencias tipo Zipf
+    rng = random.Random(size)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    parts = []
+    total = 0
+    while total < size:
+        sentence = " ".join(rng.choices(WORDS, weights, k=rng.randint(5, 18)))
+        sentence = sentence[0].upper() + sentence[1:] + rng.choice([". ", ". ", ", ", "? ", ".\n"])
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)[:size].encode("utf-8")
+
+def random_bytes(size): #Bytes aleatorios: Huffman no debería poder comprimirlos
+    return os.urandom(size)
+
+def skewed_bytes(size): #Alfabeto muy sesgado: cada byte es la mitad de probable que el anterior
+    rng = random.Random(size)
+    return bytes(rng.choices(range(16), [0.5 ** i for i in range(16)], k=size))
+
+corpus = [(f"snapshot {entries} entradas", snapshot_json(entries), True) for entries in SNAPSHOT_ENTRIES]
+corpus.append(("texto en inglés", english_text(CORPUS_SIZE), True))
+corpus.append(("bytes aleatorios", random_bytes(CORPUS_SIZE), False))
+corpus.append(("alfabeto sesgado", skewed_bytes(CORPUS_SIZE), False))
+
+# --- Motores: (comprimir, descomprimir, solo texto) ---
+work_dir = tempfile.mkdtemp(prefix="huffman_bench_")
+SOURCE = os.path.join(work_dir, "entrada.json")
+PACKED = os.path.join(work_dir, "comprimido.bin")
+RESTORED = os.path.join(work_dir, "salida.json")
+
+def file_compress(data): #Como lo usaba el servidor: archivo .json en disco a .bin en disco
+    with open(SOURCE, "wb") as f:
+        f.write(data)
+    huffman.createCompressed(SOURCE, PACKED)
+    with open(PACKED, "rb") as f:
+        return f.read()
+
+def file_decompress(packed):
+    with open(PACKED, "wb") as f:
+        f.write(packed)
+    huffman.decode(PACKED, RESTORED)
+    with open(RESTORED, "rb") as f:
+        return f.read()
+
+def text_compress(data):
+    return huffman.compressText(data.decode("utf-8"))
+
+def text_decompress(packed):
+    return huffman.decompressText(packed).encode("utf-8")
+
+# Un solo proceso: este script corre a nivel de módulo y en Windows los procesos del pool lo volverían a importar
+def blocks_compress(data):
+    return huffman.compressBlocks(data.decode("utf-8"), workers=1)
+
+def blocks_decompress(packed):
+    return huffman.decompressBlocks(packed, workers=1).encode("utf-8")
+
+def stream_compress(data):
+    dst = io.BytesIO()
+    huffman.compress_stream(io.BytesIO(data), dst)
+    return dst.getvalue()
+
+def stream_decompress(packed):
+    dst = io.BytesIO()
+    huffman.decompress_stream(io.BytesIO(packed), dst)
+    return dst.getvalue()
+
+ENGINES = {
+    "archivo (createCompressed/decode)": (file_compress, file_decompress, True),
+    "memoria (compressText)": (text_compress, text_decompress, True),
+    "bloques (compressBlocks)": (blocks_compress, blocks_decompress, True),
+    "binario (compress_stream)": (stream_compress, stream_decompress, False),
+    "zlib nivel 6": (zlib.compress, zlib.decompress, False),
+}
+
+# --- Medición ---
+def measure(func, arg): #Regresa (resultado, segundos)
+    start = time.perf_counter()
+    result = func(arg)
+    return result, time.perf_counter() - start
+
+def peak_memory(func, arg): #Pico de memoria reservada por Python durante la llamada (tracemalloc), en bytes
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def tree_build_time(data, is_text): #Segundos para construir el árbol y los códigos canónicos a partir de las frecuencias
+    counter = Counter(data.decode("utf-8")) if is_text else Counter(chr(byte) for byte in data)
+    nodeList = [huffman.Node(value=times, character=letter) for letter, times in counter.items()]
+    start = time.perf_counter()
+    huffman.canonicalCodes(huffman.lengthsFor(nodeList))
+    return time.perf_counter() - start
+
+results = []
+for name, data, is_text in corpus:
+    mb = len(data) / (1024 * 1024)
+    zlib_size = len(zlib.compress(data))
+    tree_ms = tree_build_time(data, is_text) * 1000
+    for engine, (compress, decompress, text_only) in ENGINES.items():
+        if text_only and not is_text:
+            continue
+        packed, compress_time = measure(compress, data)
+        restored, decompress_time = measure(decompress, packed)
+        assert restored == data, f"{engine} no recuperó {name}"
+        row = {
+            "input": name,
+            "engine": engine,
+            "size": len(data),
+            "compressed": len(packed),
+            "ratio": len(packed) / len(data),
+            "zlib_ratio": zlib_size / len(data),
+            "compress_mb_s": mb / compress_time,
+            "decompress_mb_s": mb / decompress_time,
+            "peak_compress_mb": peak_memory(compress, data) / (1024 * 1024),
+            "peak_decompress_mb": peak_memory(decompress, packed) / (1024 * 1024),
+            "tree_build_ms": tree_ms,
+        }
+        results.append(row)
+        print(f"{name:26} {engine:34} ratio {row['ratio']:.3f} (zlib {row['zlib_ratio']:.3f})  "
+              f"{row['compress_mb_s']:7.2f} / {row['decompress_mb_s']:7.2f} MB/s  "
+              f"pico {row['peak_compress_mb']:.1f} / {row['peak_decompress_mb']:.1f} MB  árbol {tree_ms:.1f} ms")
+
+# --- Reporte ---
+with open(REPORT_FILE, "w", encoding="utf-8") as f:
+    json.dump({"python": sys.version, "results": results}, f, indent=2, ensure_ascii=False)
+print(f"Reporte guardado en {REPORT_FILE}")
+
+# --- Graficar ---
+names = [name for name, _, _ in corpus]
+fig, (speed_ax, ratio_ax) = plt.subplots(1, 2, figsize=(14, 5))
+width = 0.8 / len(ENGINES)
+for i, engine in enumerate(ENGINES):
+    rows = {row["input"]: row for row in results if row["engine"] == engine}
+    positions = [n + i * width for n, name in enumerate(names) if name in rows]
+    speed_ax.bar(positions, [rows[name]["compress_mb_s"] for name in names if name in rows], width, label=engine)
+    ratio_ax.bar(positions, [rows[name]["ratio"] for name in names if name in rows], width, label=engine)
+for ax in (speed_ax, ratio_ax):
+    ax.set_xticks([n + 0.4 - width / 2 for n in range(len(names))])
+    ax.set_xticklabels(names, rotation=20, ha="right")
+    ax.grid(True, axis="y")
+speed_ax.set_ylabel("Throughput al comprimir (MB/s)")
+speed_ax.set_title("Huffman: throughput por entrada")
+ratio_ax.set_ylabel("Tamaño comprimido / original")
+ratio_ax.set_title("Huffman: razón de compresión vs zlib")
+ratio_ax.legend()
+plt.tight_layout()
+plt.show()
+
+# --- Limpiar archivos de prueba ---
+for file in (SOURCE, PACKED, RESTORED):
+    if os.path.exists(file):
+        os.remove(file)
+os.rmdir(work_dir)
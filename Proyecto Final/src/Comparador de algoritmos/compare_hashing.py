@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import tempfile
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Compartido"))
+from hashing import calc_sha256, hash_files
+
+# --- Generar archivos de prueba ---
+FILE_COUNT = 64
+FILE_SIZE = 4 * 1024 * 1024  # 4 MB por archivo
+WORKERS = [1, 2, 4, 8, 16]
+
+test_dir = tempfile.mkdtemp(prefix="hash_bench_")
+file_names = []
+for i in range(FILE_COUNT):
+    filename = os.path.join(test_dir, f"test_{i}.bin")
+    with open(filename, "wb") as f:
+        f.write(os.urandom(FILE_SIZE))  # archivo con datos aleatorios
+    file_names.append(filename)
+
+# --- Medir throughput por número de hilos ---
+total_mb = FILE_COUNT * FILE_SIZE / (1024 * 1024)
+throughputs = []
+for workers in WORKERS:
+    start = time.perf_counter()
+    hash_files(file_names, calc_sha256, workers)
+    elapsed = time.perf_counter() - start
+    throughputs.append(total_mb / elapsed)
+    print(f"{workers} hilos: {total_mb / elapsed:.1f} MB/s")
+
+# --- Graficar ---
+plt.plot(WORKERS, throughputs, marker='o', label=f"{FILE_COUNT} archivos de {FILE_SIZE // (1024 * 1024)} MB")
+plt.xlabel("Número de hilos")
+plt.ylabel("Throughput (MB/s)")
+plt.title("Hash SHA256 en paralelo: throughput vs número de hilos")
+plt.legend()
+plt.grid(True)
+plt.show()
+
+# --- Limpiar archivos de prueba ---
+for file in file_names:
+    os.remove(file)
+os.rmdir(test_dir)
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Técnica voraz"))
+import huffman
+
+# --- Codificador anterior: concatena un string de bits por carácter ---
+def legacy_encode(route, codeMap):
+    myString = ""
+    with open(route, "r", encoding="utf-8") as archive:
+        text = archive.read()
+
+    for character in text:
+        code, length = codeMap[character]
+        myString += format(code, f'0{length}b')
+
+    length = len(myString)
+    while len(myString) % 8 != 0:
+        myString += "0"
+    return length, int(myString, 2).to_bytes(len(myString) // 8, "big")
+
+# --- Decodificador anterior: expande los bytes a un string de bits y lo recorre bit por bit ---
+def legacy_decode(length, data, codeMap):
+    myString = bin(int.from_bytes(data, "big"))[2:].zfill(len(data) * 8)[:length]
+    reverse = {format(code, f'0{length}b'): character for character, (code, length) in codeMap.items()}
+
+    current = ""
+    decoded = ""
+    for bit in myString:
+        current += bit
+        if current in reverse:
+            decoded += reverse[current]
+            current = ""
+    return decoded
+
+def build_codes(route): #Códigos canónicos {carácter: (código, longitud)} del archivo
+    tree = huffman.createKeys(huffman.createTree(huffman.decodeByChar(route)))
+    return huffman.canonicalCodes(huffman.codeLengths(huffman.createKeyList(tree)))
+
+# --- Generar snapshots de prueba (JSON como el de TMP_JSON) ---
+SIZES = [1000, 5000, 20000, 50000]  # archivos en el snapshot
+
+test_dir = tempfile.mkdtemp(prefix="huffman_bench_")
+file_names = []
+for count in SIZES:
+    snapshot = {f"carpeta_{i % 50}/archivo_{i}.txt": "%064x" % random.getrandbits(256) for i in range(count)}
+    filename = os.path.join(test_dir, f"snapshot_{count}.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=4)
+    file_names.append(filename)
+
+# --- Medir MB/s de cada codificador y decodificador (mismos códigos, salida idéntica) ---
+legacy_speeds = []
+packed_speeds = []
+legacy_decode_speeds = []
+table_decode_speeds = []
+for count, filename in zip(SIZES, file_names):
+    mb = os.path.getsize(filename) / (1024 * 1024)
+    codes = build_codes(filename)
+
+    start = time.perf_counter()
+    legacy = legacy_encode(filename, codes)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    packed = huffman.packBits(filename, codes)
+    packed_time = time.perf_counter() - start
+
+    assert legacy[0] == packed[0] and legacy[1] == bytes(packed[1])
+    legacy_speeds.append(mb / legacy_time)
+    packed_speeds.append(mb / packed_time)
+    print(f"{count} archivos ({mb:.2f} MB): concatenación {mb / legacy_time:.2f} MB/s, "
+          f"empaquetado {mb / packed_time:.2f} MB/s ({legacy_time / packed_time:.1f}x)")
+
+    start = time.perf_counter()
+    legacy_text = legacy_decode(packed[0], bytes(packed[1]), codes)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table_text = huffman.decodeBytes(bytes(packed[1]), packed[0], huffman.codeTable(codes))
+    table_time = time.perf_counter() - start
+
+    assert legacy_text == table_text
+    legacy_decode_speeds.append(mb / legacy_time)
+    table_decode_speeds.append(mb / table_time)
+    print(f"{count} archivos ({mb:.2f} MB): decodificar bit por bit {mb / legacy_time:.2f} MB/s, "
+          f"por tabla {mb / table_time:.2f} MB/s ({legacy_time / table_time:.1f}x)")
+
+# --- Graficar ---
+plt.plot(SIZES, legacy_speeds, marker='o', label="Concatenación de strings")
+plt.plot(SIZES, packed_speeds, marker='o', label="Empaquetado en bytearray")
+plt.plot(SIZES, legacy_decode_speeds, marker='s', label="Decodificación bit por bit")
+plt.plot(SIZES, table_decode_speeds, marker='s', label="Decodificación por tabla")
+plt.xlabel("Archivos en el snapshot")
+plt.ylabel("Throughput (MB/s)")
+plt.title("Huffman: throughput vs tamaño del snapshot")
+plt.legend()
+plt.grid(True)
+plt.show()
+
+# --- Limpiar archivos de prueba ---
+for file in file_names:
+    os.remove(file)
+os.rmdir(test_dir)
@@ -0,0 +1,76 @@
+import json
+import hashlib
+from chunking import read_exact
+
+BATCH_MAX_FILE = 256 * 1024  # archivos de hasta 256 KB viajan en lotes
+BATCH_BYTES = 8 * 1024 * 1024  # bytes máximos por lote
+BATCH_MAX_FILES = 1000  # archivos máximos por lote
+BATCH_MAX_HEADER = 64 * 1024  # bytes máximos del encabezado JSON de un marco
+
+'''Formato de un lote: una secuencia de marcos, cada uno con el largo del encabezado (4 bytes), el encabezado
+JSON {path, size, hash} y después size bytes con el contenido. Un encabezado de largo 0 marca el final del lote.
+Así el lote se escribe y se lee como stream, sin armar un archivo tar ni cargar todo el lote en memoria.'''
+def frame(header, data): #Regresa los bytes de un marco (encabezado + contenido)
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return len(encoded).to_bytes(4, "big") + encoded + data
+
+def end_frame():
+    return (0).to_bytes(4, "big")
+
+'''Genera los marcos de un lote a partir de [(ruta relativa, ruta en disco)]. Omite los archivos que no se pueden leer
+y los que pasan de max_size bytes; de cada archivo se leen a lo más max_size + 1 bytes, así un archivo grande que
+llegue a un lote nunca se carga completo en memoria.'''
+def write_frames(files, max_size=BATCH_MAX_FILE):
+    for rel, path in files:
+        try:
+            with open(path, "rb") as f:
+                data = f.read(max_size + 1)
+        except OSError:
+            continue
+        if len(data) > max_size:
+            continue
+        yield frame({"path": rel, "size": len(data), "hash": hashlib.sha256(data).hexdigest()}, data)
+    yield end_frame()
+
+'''Lee los marcos de un stream y regresa (encabezado, contenido) por cada archivo del lote. Si el stream se corta
+antes del marco final, un encabezado no es válido, un archivo pasa de max_size bytes o un contenido no coincide
+con su hash lanza ValueError. Los tamaños se revisan antes de leer, así el otro lado no puede hacer que se
+reserve memoria por el tamaño que declare.'''
+def read_frames(stream, max_size=BATCH_MAX_FILE):
+    while True:
+        head = read_exact(stream, 4)
+        if len(head) != 4:
+            raise ValueError("lote incompleto")
+        size = int.from_bytes(head, "big")
+        if size == 0:
+            return
+        if size > BATCH_MAX_HEADER:
+            raise ValueError("encabezado de marco demasiado grande")
+        header = json.loads(read_exact(stream, size))
+        if not isinstance(header, dict) or not isinstance(header.get("path"), str) or not isinstance(header.get("hash"), str) \
+                or type(header.get("size")) is not int or header["size"] < 0:
+            raise ValueError("encabezado de marco inválido")
+        if header["size"] > max_size:
+            raise ValueError(f"archivo demasiado grande para un lote: {header['path']}")
+        data = read_exact(stream, header["size"])
+        if len(data) != header["size"]:
+            raise ValueError(f"lote incompleto en {header['path']}")
+        if hashlib.sha256(data).hexdigest() != header["hash"]:
+            raise ValueError(f"hash inválido en {header['path']}")
+        yield header, data
+
+'''Agrupa [(ruta, tamaño)] en lotes que no pasan de max_bytes ni de max_files, en el orden recibido.'''
+def make_batches(items, max_bytes=BATCH_BYTES, max_files=BATCH_MAX_FILES):
+    batches = []
+    current = []
+    current_bytes = 0
+    for rel, size in items:
+        if current and (current_bytes + size > max_bytes or len(current) >= max_files):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(rel)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
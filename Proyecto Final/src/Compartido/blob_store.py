@@ -0,0 +1,61 @@
+import os
+import re
+import uuid
+import shutil
+from pathlib import Path
+
+def is_sha256(value): #True si value es un sha256 en hexadecimal (64 caracteres en minúsculas)
+    return isinstance(value, str) and re.fullmatch(r"[0-9a-f]{64}", value) is not None
+
+'''Almacén de contenido direccionado por hash: cada contenido distinto se guarda una sola vez en
+blobs/<2 primeros caracteres del sha256>/<resto del sha256>. Los archivos de uploads/ con el mismo
+contenido se vuelven enlaces duros al mismo blob, así que ocupan espacio y se hashean una sola vez.
+Como varias rutas pueden compartir inodo, el servidor nunca escribe sobre un archivo existente:
+siempre escribe en un temporal y lo reemplaza con os.replace.'''
+class BlobStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True, parents=True)
+
+    def path_for(self, file_hash): #Ruta del blob; el hash viene de los clientes, así que se valida antes de armar la ruta
+        if not is_sha256(file_hash):
+            raise ValueError(f"hash inválido: {file_hash!r}")
+        return self.root / file_hash[:2] / file_hash[2:]
+
+    def has(self, file_hash):
+        return is_sha256(file_hash) and self.path_for(file_hash).is_file()
+
+    def _link_or_copy(self, src, dest): #Crea dest como enlace duro a src (o copia si el sistema no lo permite)
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.link")
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+
+    '''Hace que un archivo recién indexado comparta inodo con su blob: si el blob ya existe el archivo se
+    reemplaza por un enlace al blob; si no, el archivo se enlaza dentro del almacén y pasa a ser el blob.'''
+    def adopt(self, path, file_hash):
+        blob = self.path_for(file_hash)
+        try:
+            if blob.exists():
+                if not os.path.samefile(blob, path):
+                    self._link_or_copy(blob, Path(path))
+            else:
+                blob.parent.mkdir(exist_ok=True)
+                os.link(path, blob)
+        except OSError:
+            pass  # sin enlaces duros el archivo queda como copia independiente
+
+    def link_to(self, file_hash, path): #Crea una ruta de uploads/ a partir de un blob existente, sin recibir el contenido
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._link_or_copy(self.path_for(file_hash), path)
+
+    def release(self, file_hash): #Borra el blob si ya ninguna ruta de uploads/ lo usa (solo queda su propio enlace)
+        blob = self.path_for(file_hash)
+        try:
+            if blob.stat().st_nlink <= 1:
+                blob.unlink()
+        except OSError:
+            pass
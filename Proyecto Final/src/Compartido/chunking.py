@@ -0,0 +1,61 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB por bloque
+DELTA_MIN_SIZE = 8 * 1024 * 1024  # archivos más chicos se suben completos
+
+'''Recorre un archivo abierto en binario y regresa sus bloques de CHUNK_SIZE bytes (el último puede ser menor).
+Los bloques son de tamaño fijo para que dividir un archivo cueste lo mismo que hashearlo, sin recorrer los bytes
+uno por uno en Python. Sirven para los cambios que no mueven el resto del archivo (modificar en el lugar o agregar
+al final); insertar bytes en medio desplaza los bloques siguientes y esos se vuelven a subir.'''
+def iter_chunks(f):
+    while True:
+        chunk = read_exact(f, CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < CHUNK_SIZE:
+            return
+
+'''Divide un archivo en bloques de CHUNK_SIZE bytes y regresa la lista [[sha256, tamaño], ...].
+Es la lista que se guarda en el snapshot para saber qué bloques hay que subir.'''
+def chunk_file(path):
+    with open(path, "rb") as f:
+        return [[hashlib.sha256(chunk).hexdigest(), len(chunk)] for chunk in iter_chunks(f)]
+
+def read_exact(stream, size): #Lee exactamente size bytes de un stream (o menos si se acaba)
+    parts = []
+    while size > 0:
+        data = stream.read(size)
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+    return b"".join(parts)
+
+'''Reconstruye un archivo a partir de su lista de bloques: los que ya existen en la versión anterior (basis)
+se copian desde ese archivo y los demás se leen en orden del stream. Verifica el hash de cada bloque y
+regresa el sha256 del archivo completo; si algún bloque no coincide lanza ValueError.'''
+def assemble_file(chunks, basis_path, basis_chunks, stream, out_path):
+    offsets = {}
+    offset = 0
+    for chunk_hash, length in basis_chunks:
+        offsets.setdefault(chunk_hash, offset)
+        offset += length
+    h = hashlib.sha256()
+    old = open(basis_path, "rb") if offsets else None
+    try:
+        with open(out_path, "wb") as out:
+            for chunk_hash, length in chunks:
+                if chunk_hash in offsets:
+                    old.seek(offsets[chunk_hash])
+                    block = old.read(length)
+                else:
+                    block = read_exact(stream, length)
+                if len(block) != length or hashlib.sha256(block).hexdigest() != chunk_hash:
+                    raise ValueError(f"bloque inválido: {chunk_hash}")
+                out.write(block)
+                h.update(block)
+    finally:
+        if old is not None:
+            old.close()
+    return h.hexdigest()
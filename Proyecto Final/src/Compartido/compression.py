@@ -0,0 +1,169 @@
+import os
+import time
+import zlib
+import threading
+
+try:
+    import zstandard  # opcional: pip install zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_LEVEL = 3  # nivel bajo: en transferencias importa más la velocidad que la última fracción de tamaño
+TRANSPORT_BLOCK = 1024 * 1024  # bloque que se comprime o descomprime por llamada
+SAMPLE_SIZE = 64 * 1024  # bytes del inicio del archivo que se prueban antes de decidir
+MIN_COMPRESS_SIZE = 1024  # archivos más chicos se mandan tal cual
+MAX_RATIO = 0.9  # si la muestra no baja al menos 10% no se comprime
+COMPRESSED_EXTS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".lz4",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mkv", ".avi", ".mov", ".ogg", ".flac",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".jar", ".apk"
+}
+
+# Códecs por nombre de Content-Encoding: (crea compresor, crea descompresor). Ambos con compress/decompress y flush.
+CODECS = {
+    "gzip": (lambda: zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31), lambda: zlib.decompressobj(31)),
+    "deflate": (lambda: zlib.compressobj(COMPRESS_LEVEL), lambda: zlib.decompressobj())
+}
+if zstandard is not None:
+    CODECS["zstd"] = (lambda: zstandard.ZstdCompressor(level=COMPRESS_LEVEL).compressobj(),
+                      lambda: zstandard.ZstdDecompressor().decompressobj())
+PREFERRED = [name for name in ("zstd", "gzip", "deflate") if name in CODECS]
+
+_stats_lock = threading.Lock()
+_stats = {"raw": 0, "wire": 0, "seconds": 0.0}
+
+
+def accept_encoding(): #Valor de Accept-Encoding con los códecs disponibles en este equipo
+    return ", ".join(PREFERRED)
+
+def pick_codec(header): #Primer códec propio que aparece en un Accept-Encoding recibido (None si no hay ninguno)
+    offered = {token.split(";")[0].strip().lower() for token in (header or "").split(",")}
+    for name in PREFERRED:
+        if name in offered:
+            return name
+    return None
+
+def already_compressed(name): #True si la extensión es de un formato que ya viene comprimido
+    return os.path.splitext(str(name))[1].lower() in COMPRESSED_EXTS
+
+'''Decide si vale la pena comprimir un archivo: no se comprimen formatos que ya vienen comprimidos ni archivos
+muy pequeños, y del resto se comprime una muestra del inicio con zlib nivel 1 para ver si el tamaño baja.'''
+def worth_compressing(path):
+    if already_compressed(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            sample = f.read(SAMPLE_SIZE)
+    except OSError:
+        return False
+    if len(sample) < MIN_COMPRESS_SIZE:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * MAX_RATIO
+
+def _count(raw, wire, seconds):
+    with _stats_lock:
+        _stats["raw"] += raw
+        _stats["wire"] += wire
+        _stats["seconds"] += seconds
+
+def read_blocks(path): #Lee un archivo en bloques de TRANSPORT_BLOCK
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(TRANSPORT_BLOCK)
+            if not block:
+                return
+            yield block
+
+def compress_blocks(blocks, codec): #Comprime un iterable de bloques como un solo stream del códec indicado
+    compressor = CODECS[codec][0]()
+    for block in blocks:
+        start = time.perf_counter()
+        out = compressor.compress(block)
+        _count(len(block), len(out), time.perf_counter() - start)
+        if out:
+            yield out
+    start = time.perf_counter()
+    out = compressor.flush()
+    _count(0, len(out), time.perf_counter() - start)
+    if out:
+        yield out
+
+class _WireReader: #Lee del stream original y cuenta los bytes comprimidos que se consumen
+    def __init__(self, raw):
+        self.raw = raw
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.consumed += len(data)
+        return data
+
+'''Envuelve un stream (cuerpo de una petición o respuesta) y lo descomprime al leerlo con el códec de su
+Content-Encoding. Sin códec regresa los bytes tal cual. Tiene read(size) para usarse igual que el stream original.
+Cada read descomprime solo los bytes que faltan para entregar size (zlib con max_length y unconsumed_tail, zstd con
+stream_reader), así un cuerpo muy comprimible nunca se expande completo en memoria. Lo descomprimido se guarda en
+un bytearray con una posición de lectura, en lugar de recortar y copiar el buffer en cada llamada.'''
+class DecodedStream:
+    def __init__(self, raw, codec=None):
+        if codec and codec not in CODECS:
+            raise ValueError(f"Content-Encoding no soportado: {codec}")
+        self.raw = raw
+        self.decoder = None
+        self.reader = None
+        if codec == "zstd":  # el decompressobj de zstandard no acepta max_length
+            self.wire = _WireReader(raw)
+            self.reader = zstandard.ZstdDecompressor().stream_reader(self.wire, read_size=TRANSPORT_BLOCK, closefd=False)
+        elif codec:
+            self.decoder = CODECS[codec][1]()
+        self.tail = b""  # comprimido que zlib todavía no consumió
+        self.buffer = bytearray()
+        self.pos = 0
+        self.eof = False
+
+    def _decode(self, want): #Descomprime a lo más want bytes más y los agrega al buffer
+        start = time.perf_counter()
+        try:
+            if self.reader is not None:
+                before = self.wire.consumed
+                out = self.reader.read(want)
+                wire = self.wire.consumed - before
+                self.eof = not out
+            else:
+                data = self.tail or self.raw.read(TRANSPORT_BLOCK)
+                if data:
+                    out = self.decoder.decompress(data, want)
+                    self.tail = self.decoder.unconsumed_tail
+                    wire = len(data) - len(self.tail)
+                else:
+                    out = self.decoder.flush()
+                    wire = 0
+                    self.eof = True
+        except Exception as e:  # zlib.error o zstandard.ZstdError
+            raise ValueError(f"stream comprimido inválido: {e}") from e
+        _count(len(out), wire, time.perf_counter() - start)
+        self.buffer += out
+
+    def read(self, size=-1):
+        if self.decoder is None and self.reader is None:
+            return self.raw.read(size)
+        if size < 0:
+            return b"".join(iter(lambda: self.read(TRANSPORT_BLOCK), b""))
+        while not self.eof and len(self.buffer) - self.pos < size:
+            self._decode(size - (len(self.buffer) - self.pos))
+        out = bytes(self.buffer[self.pos:self.pos + size])
+        self.pos += len(out)
+        if self.pos * 2 >= len(self.buffer):  # se descarta lo ya entregado cuando es al menos la mitad del buffer
+            del self.buffer[:self.pos]
+            self.pos = 0
+        return out
+
+def compression_stats(): #Bytes originales, bytes que viajaron y segundos de CPU usados desde el último reinicio
+    with _stats_lock:
+        return dict(_stats)
+
+def reset_compression_stats():
+    with _stats_lock:
+        _stats["raw"] = 0
+        _stats["wire"] = 0
+        _stats["seconds"] = 0.0
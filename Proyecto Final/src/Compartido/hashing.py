@@ -0,0 +1,118 @@
+import os
+import mmap
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_WORKERS = min(8, os.cpu_count() or 1)  # hilos que calculan hashes al mismo tiempo
+MIN_BLOCK = 64 * 1024  # 64 KB
+MAX_BLOCK = 4 * 1024 * 1024  # 4 MB
+MMAP_THRESHOLD = 64 * 1024 * 1024  # archivos de 64 MB o más se hashean con mmap
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"bytes": 0, "seconds": 0.0, "active": 0, "since": 0.0}  # active: hashes en curso; since: desde cuándo hay alguno
+
+'''Tamaño de bloque adaptativo: potencia de 2 cercana a 1/16 del archivo, entre MIN_BLOCK y MAX_BLOCK.
+Archivos pequeños se leen en pocas llamadas y los grandes no usan más de 4 MB de memoria.'''
+def block_size_for(size):
+    block = MIN_BLOCK
+    while block < MAX_BLOCK and block * 16 < size:
+        block *= 2
+    return block
+
+def _buffer(size): #Buffer reutilizable por hilo, así no se crea un bytes nuevo por cada bloque leído
+    buf = getattr(_local, "buf", None)
+    if buf is None or len(buf) < size:
+        buf = _local.buf = bytearray(size)
+    return buf
+
+def _hash_readinto(f, block, h): #Lee con readinto sobre el mismo buffer y pasa a sha256 solo la parte leída
+    total = 0
+    view = memoryview(_buffer(block))[:block]
+    while True:
+        n = f.readinto(view)
+        if not n:
+            break
+        h.update(view[:n])
+        total += n
+    view.release()
+    return total
+
+def _hash_mmap(mm, h): #Recorre el archivo mapeado en rebanadas de MAX_BLOCK sin copiarlo a memoria
+    with memoryview(mm) as view:
+        for offset in range(0, len(mm), MAX_BLOCK):
+            h.update(view[offset:offset + MAX_BLOCK])
+    return len(mm)
+
+'''Función que realiza el calculo del hash de los archivos, se implementa DYV: recibe una ruta de un archivo
+y lo va procesando por bloques cuyo tamaño depende del tamaño del archivo. Nunca carga el archivo completo
+en memoria: los archivos grandes se mapean con mmap y el resto se lee con readinto sobre un buffer reutilizado.'''
+def calc_sha256(path):
+    h = hashlib.sha256()
+    total = 0
+    _begin()
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            mm = None
+            if size >= MMAP_THRESHOLD:
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    mm = None
+            if mm is not None:
+                with mm:
+                    total = _hash_mmap(mm, h)
+            else:
+                total = _hash_readinto(f, block_size_for(size), h)
+    finally:
+        _end(total)
+    return h.hexdigest()
+
+'''El tiempo se mide en reloj de pared mientras haya al menos un hash en curso, no sumando la duración de cada
+llamada: con varios hilos de hash_files las llamadas se traslapan y sumarlas daría el throughput de un solo hilo.'''
+def _begin():
+    with _stats_lock:
+        if _stats["active"] == 0:
+            _stats["since"] = time.perf_counter()
+        _stats["active"] += 1
+
+def _end(total):
+    with _stats_lock:
+        _stats["bytes"] += total
+        _stats["active"] -= 1
+        if _stats["active"] == 0:
+            _stats["seconds"] += time.perf_counter() - _stats["since"]
+
+def hash_throughput(): #Bytes por segundo de todos los hashes desde el último reinicio (total de todos los hilos)
+    with _stats_lock:
+        seconds = _stats["seconds"]
+        if _stats["active"]:
+            seconds += time.perf_counter() - _stats["since"]
+        if seconds == 0:
+            return 0.0
+        return _stats["bytes"] / seconds
+
+def reset_hash_stats():
+    with _stats_lock:
+        _stats["bytes"] = 0
+        _stats["seconds"] = 0.0
+        _stats["since"] = time.perf_counter()
+
+def _safe(hash_func, path): #Si el archivo desaparece o no se puede leer regresa None en lugar de detener todo
+    try:
+        return hash_func(path)
+    except OSError:
+        return None
+
+'''Calcula el hash de varios archivos en paralelo con un pool de hilos (hashlib libera el GIL mientras
+procesa cada bloque, así que varios hilos leen y hashean al mismo tiempo). Regresa una lista con los
+hashes en el mismo orden que las rutas recibidas; None para los archivos que no se pudieron leer.'''
+def hash_files(paths, hash_func=calc_sha256, workers=HASH_WORKERS):
+    paths = list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        return [_safe(hash_func, p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(lambda p: _safe(hash_func, p), paths))
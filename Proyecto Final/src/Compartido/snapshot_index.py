@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import uuid
+import threading
+from pathlib import Path
+from hashing import hash_files, HASH_WORKERS
+from chunking import chunk_file
+
+RESCAN_INTERVAL = 30  # segundos entre revalidaciones completas por stat
+MAX_JOURNAL = 10000  # cambios que se conservan en el diario antes de compactarlo
+LOG_COMPACT_MIN = 1000  # registros mínimos del log antes de reescribir el índice completo
+
+'''Recorre recursivamente una carpeta con os.scandir y regresa (ruta relativa, stat) de cada archivo.
+Solo hace una llamada stat por archivo, no abre ni lee ningún archivo.'''
+def scan_files(root, prefix=""):
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        rel = f"{prefix}{entry.name}"
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path, rel + "/")
+            elif entry.is_file():
+                yield rel, entry.stat()
+        except OSError:
+            continue
+
+
+def stat_key(st): #Firma de un archivo (tamaño, tiempo de modificación en ns, inodo)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+'''Índice persistente del snapshot del servidor. Guarda por cada ruta relativa su tamaño, mtime_ns, inodo y hash.
+Las subidas y eliminaciones solo actualizan las entradas que tocan, y el resto se revalida solo con stat:
+un archivo se vuelve a hashear únicamente si su firma (tamaño, mtime_ns, inodo) cambió.
+Cada cambio se agrega a un diario con un número de secuencia creciente (seq) para que los clientes
+pidan solo lo que cambió desde su último cursor. El epoch identifica el diario: si el índice se
+pierde y se crea de nuevo, cambia y los clientes saben que su cursor ya no es válido.
+En disco cada cambio solo agrega una línea a <index_file>.log; el índice completo se reescribe (y el log
+se vacía) cuando el log llega a tantos registros como entradas tiene el índice, con LOG_COMPACT_MIN como mínimo.
+Si recibe un BlobStore, cada archivo indexado se enlaza a su blob por hash y los blobs que ya no usa
+ninguna ruta se liberan.'''
+class SnapshotIndex:
+    def __init__(self, root, index_file, hash_func, rescan_interval=RESCAN_INTERVAL, max_journal=MAX_JOURNAL,
+                 workers=HASH_WORKERS, store=None, log_compact_min=LOG_COMPACT_MIN):
+        self.root = Path(root)
+        self.index_file = index_file
+        self.log_file = f"{index_file}.log"
+        self.log_compact_min = log_compact_min
+        self.hash_func = hash_func
+        self.workers = workers
+        self.store = store
+        self.rescan_interval = rescan_interval
+        self.max_journal = max_journal
+        self.lock = threading.RLock()
+        self.changed_cond = threading.Condition(self.lock)
+        self.entries = {}
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.journal = []
+        self.log_id = None  # identifica el log que corresponde al índice completo guardado
+        self.pending = []  # registros del log que aún no se escriben en disco
+        self.log_records = 0
+        self.version = 0
+        self.last_scan = 0
+        self._cache = None
+        self._cache_version = -1
+        self._load()
+
+    def _load(self): #Carga el índice guardado en disco, si existe, y le aplica los cambios del log
+        if not os.path.exists(self.index_file):
+            self._save()  # persiste el epoch nuevo aunque todavía no haya cambios (y descarta un log huérfano)
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = data.get("entries", {})
+            self.epoch = data.get("epoch", self.epoch)
+            self.seq = data.get("seq", 0)
+            self.journal = data.get("journal", [])
+            self.log_id = data.get("log_id")
+        except (OSError, ValueError):
+            self.entries = {}
+            self._save()
+            return
+        if not self._replay():
+            self._save()  # empieza un log limpio para que los cambios nuevos no queden detrás de uno inválido
+
+    '''Aplica en orden los registros de <index_file>.log sobre el índice cargado. La primera línea del log
+    lleva el log_id del índice completo al que pertenece: si no coincide, el servidor se cerró a mitad de una
+    compactación y el índice completo ya incluye esos registros. Una última línea incompleta (el servidor se
+    cerró mientras escribía) se ignora. Regresa False si hay que empezar un log nuevo.'''
+    def _replay(self):
+        try:
+            with open(self.log_file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return False
+        try:
+            if not lines or json.loads(lines[0]).get("log_id") != self.log_id:
+                return False
+        except ValueError:
+            return False
+        clean = True
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                clean = False
+                break
+            if record["entry"] is None:
+                self.entries.pop(record["path"], None)
+            else:
+                self.entries[record["path"]] = record["entry"]
+            change = record["change"]
+            if change is not None:
+                self.seq = change["seq"]
+                self.journal.append(change)
+            self.log_records += 1
+        if len(self.journal) > self.max_journal:
+            del self.journal[:len(self.journal) - self.max_journal]
+        return clean
+
+    def _save(self): #Escribe el índice completo en un temporal, lo reemplaza de forma atómica y vacía el log
+        tmp = f"{self.index_file}.tmp"
+        self.log_id = uuid.uuid4().hex
+        data = {"epoch": self.epoch, "seq": self.seq, "log_id": self.log_id, "journal": self.journal, "entries": self.entries}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.index_file)
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"log_id": self.log_id}) + "\n")
+        self.pending = []
+        self.log_records = 0
+
+    def _flush(self): #Agrega al log los registros pendientes, o compacta si el log ya es tan grande como el índice
+        if not self.pending:
+            return
+        if self.log_records + len(self.pending) >= max(self.log_compact_min, len(self.entries)):
+            self._save()
+            return
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self.pending))
+        self.log_records += len(self.pending)
+        self.pending = []
+
+    def _make_entry(self, st, file_hash):
+        return {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "ino": st.st_ino,
+            "hash": file_hash
+        }
+
+    def _same(self, entry, st):
+        return (entry["size"], entry["mtime_ns"], entry["ino"]) == stat_key(st)
+
+    def _put(self, rel, entry): #Guarda una entrada y registra el cambio solo si el hash es distinto
+        prev = self.entries.get(rel)
+        self.entries[rel] = entry
+        change = None
+        if prev is None or prev["hash"] != entry["hash"]:
+            change = self._record(rel, "put", entry["hash"], entry["size"])
+            if prev is not None and self.store:
+                self.store.release(prev["hash"])
+        self.pending.append({"path": rel, "entry": entry, "change": change})
+
+    def _drop(self, rel):
+        entry = self.entries.pop(rel)
+        change = self._record(rel, "delete", None, 0)
+        self.pending.append({"path": rel, "entry": None, "change": change})
+        if self.store:
+            self.store.release(entry["hash"])
+
+    def _record(self, rel, op, file_hash, size): #Agrega un cambio al diario, lo compacta si crece demasiado y lo regresa
+        self.seq += 1
+        change = {"seq": self.seq, "path": rel, "op": op, "hash": file_hash, "size": size}
+        self.journal.append(change)
+        if len(self.journal) > self.max_journal:
+            del self.journal[:len(self.journal) - self.max_journal]
+        return change
+
+    def _put_many(self, pending): #Hashea en paralelo las rutas pendientes [(rel, stat)] y las guarda en orden
+        paths = [self.root / rel for rel, _ in pending]
+        changed = False
+        for (rel, st), file_hash in zip(pending, hash_files(paths, self.hash_func, self.workers)):
+            if file_hash is None:
+                continue
+            if self.store:
+                self.store.adopt(self.root / rel, file_hash)
+                st = os.stat(self.root / rel)  # al enlazarse al blob cambia el inodo
+            self._put(rel, self._make_entry(st, file_hash))
+            changed = True
+        return changed
+
+    def _changed(self):
+        self.version += 1
+        self._flush()
+        self.changed_cond.notify_all()
+
+    '''Revalida todo el índice solo con stat: agrega archivos nuevos, rehashea los que cambiaron de firma
+    y quita los que ya no existen. Regresa True si hubo algún cambio.'''
+    def revalidate(self):
+        with self.lock:
+            seen = set()
+            pending = []
+            for rel, st in scan_files(self.root):
+                seen.add(rel)
+                entry = self.entries.get(rel)
+                if entry is None or not self._same(entry, st):
+                    pending.append((rel, st))
+            changed = self._put_many(pending)
+            for rel in list(self.entries):
+                if rel not in seen:
+                    self._drop(rel)
+                    changed = True
+            self.last_scan = time.time()
+            if changed:
+                self._changed()
+            return changed
+
+    def refresh(self, force=False): #Revalida solo si pasó el intervalo; si no, el índice en memoria es válido
+        if force or time.time() - self.last_scan >= self.rescan_interval:
+            with self.lock:  # con muchas peticiones al mismo tiempo solo la primera revalida
+                if force or time.time() - self.last_scan >= self.rescan_interval:
+                    return self.revalidate()
+        return False
+
+    '''Actualiza solo las rutas indicadas (recién escritas por el servidor). Si una ruta es carpeta
+    se indexan los archivos que contiene.'''
+    def update_paths(self, rels):
+        with self.lock:
+            pending = []
+            for rel in rels:
+                path = self.root / rel
+                if path.is_dir():
+                    prefix = rel.rstrip("/") + "/"
+                    pending.extend(scan_files(path, prefix))
+                elif path.is_file():
+                    pending.append((rel, path.stat()))
+            self._put_many(pending)
+            self._changed()
+
+    def put_hashed(self, hashed): #Indexa archivos recién escritos {ruta: hash} cuyo hash se calculó al recibirlos, sin volver a leerlos
+        with self.lock:
+            for rel, file_hash in hashed.items():
+                path = self.root / rel
+                if self.store:
+                    self.store.adopt(path, file_hash)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                self._put(rel, self._make_entry(st, file_hash))
+            self._changed()
+
+    def has_hash(self, file_hash): #True si el servidor ya guarda un blob con ese contenido
+        return bool(self.store) and self.store.has(file_hash)
+
+    def put_known(self, rel, file_hash): #Crea una ruta a partir de un blob existente y la indexa sin volver a hashear
+        with self.lock:
+            path = self.root / rel
+            self.store.link_to(file_hash, path)
+            self._put(rel, self._make_entry(path.stat(), file_hash))
+            self._changed()
+
+    def remove_paths(self, rels): #Quita las rutas indicadas y todo lo que esté debajo de ellas
+        with self.lock:
+            for rel in rels:
+                prefix = rel.rstrip("/") + "/"
+                for key in [k for k in self.entries if k == rel or k.startswith(prefix)]:
+                    self._drop(key)
+            self._changed()
+
+    def snapshot(self): #Regresa {ruta: hash}; solo se reconstruye cuando el índice cambió
+        with self.lock:
+            if self._cache_version != self.version:
+                self._cache = {rel: e["hash"] for rel, e in self.entries.items()}
+                self._cache_version = self.version
+            return self._cache
+
+    def wait_for_change(self, since, timeout): #Bloquea hasta que la secuencia pase de since o se acabe el tiempo
+        with self.changed_cond:
+            return self.changed_cond.wait_for(lambda: self.seq > since, timeout)
+
+    '''Regresa los cambios posteriores al cursor (epoch, since). Si el cursor es de otro epoch, es mayor que
+    la secuencia actual o el diario ya se compactó más allá de él, regresa el snapshot completo con reset=True.'''
+    def delta(self, since, epoch):
+        with self.lock:
+            first = self.journal[0]["seq"] if self.journal else self.seq + 1
+            if epoch != self.epoch or since > self.seq or since < first - 1:
+                sizes = {rel: e["size"] for rel, e in self.entries.items()}
+                return {"reset": True, "epoch": self.epoch, "seq": self.seq, "snapshot": self.snapshot(), "sizes": sizes}
+            changes = self.journal[since - first + 1:]
+            return {"reset": False, "epoch": self.epoch, "seq": self.seq, "changes": changes}
+
+    '''Lista de bloques [[sha256, tamaño], ...] de la versión actual de un archivo, para las subidas por bloques.
+    Se calcula una sola vez por versión (se guarda en la entrada del índice) y fuera del candado, porque en
+    archivos grandes puede tardar.'''
+    def chunks_of(self, rel):
+        with self.lock:
+            entry = self.entries.get(rel)
+            if entry is None:
+                return []
+            if "chunks" in entry:
+                return entry["chunks"]
+        try:
+            chunks = chunk_file(self.root / rel)
+        except OSError:
+            return []
+        self.set_chunks(rel, chunks, entry)
+        return chunks
+
+    def set_chunks(self, rel, chunks, entry=None): #Guarda la lista de bloques si la entrada no cambió mientras tanto
+        with self.lock:
+            current = self.entries.get(rel)
+            if current is None or (entry is not None and current is not entry):
+                return
+            current["chunks"] = chunks
+            self.pending.append({"path": rel, "entry": current, "change": None})
+            self._flush()
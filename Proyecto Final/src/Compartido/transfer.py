@@ -0,0 +1,92 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from compression import accept_encoding
+
+TRANSFER_WORKERS = 4  # transferencias al mismo tiempo
+MAX_CONNECTIONS_PER_HOST = 4  # conexiones keep-alive abiertas hacia el servidor
+RETRIES = 3  # reintentos por transferencia fallida
+BACKOFF = 0.5  # segundos de espera antes del primer reintento, se duplica en cada intento
+UPLOAD_BLOCK = 1024 * 1024  # bloque de lectura de los archivos que se suben por stream
+DOWNLOAD_BLOCK = 1024 * 1024  # bloque de escritura de las descargas
+PROGRESS_EVERY = 50  # cada cuántas transferencias se imprime el avance
+
+'''Sesión HTTP compartida: reutiliza las conexiones TCP (keep-alive) entre peticiones. El pool queda
+limitado a max_connections por host y con pool_block los hilos esperan una conexión libre en lugar
+de abrir más. Accept-Encoding anuncia los códecs disponibles para que el servidor comprima las descargas.'''
+def make_session(max_connections=MAX_CONNECTIONS_PER_HOST):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = accept_encoding()  # solo los códecs que el cliente sabe descomprimir
+    return session
+
+
+'''Cola de transferencias del cliente. Cada tarea es una función que regresa True si la transferencia
+salió bien; se ejecutan en paralelo con un pool de hilos, primero las de menor tamaño, y las que fallan
+se reintentan con espera exponencial. Lleva contadores de avance y de bytes para calcular el throughput.
+add regresa la clave de la tarea y run el resultado de cada una por clave, para que el cliente solo registre
+en su snapshot las transferencias que sí terminaron.'''
+class TransferQueue:
+    def __init__(self, workers=TRANSFER_WORKERS, retries=RETRIES, backoff=BACKOFF):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.tasks = []
+        self.results = []
+        self.lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+        self.bytes_done = 0
+
+    def add(self, name, size, func, *args): #Agrega una tarea y regresa su clave; size se usa para ordenar y para el throughput
+        key = len(self.tasks)
+        self.tasks.append((size or 0, key, name, func, args))
+        return key
+
+    def _attempt(self, func, args): #Regresa lo que regresa la tarea; un valor falso cuenta como fallo y se reintenta
+        try:
+            return func(*args)
+        except Exception as e:
+            print(f"Error en transferencia: {e}")
+            return False
+
+    def _run_one(self, task):
+        size, key, name, func, args = task
+        result = self._attempt(func, args)
+        for attempt in range(self.retries):
+            if result:
+                break
+            time.sleep(self.backoff * 2 ** attempt)
+            print(f"Reintentando ({attempt + 1}/{self.retries}): {name}")
+            result = self._attempt(func, args)
+        ok = bool(result)
+        with self.lock:
+            self.results[key] = result
+            if ok:
+                self.done += 1
+                self.bytes_done += size
+            else:
+                self.failed += 1
+            finished = self.done + self.failed
+            if finished % PROGRESS_EVERY == 0:
+                print(f"Progreso: {finished}/{len(self.tasks)} transferencias")
+        return ok
+
+    def run(self): #Ejecuta todas las tareas pendientes, imprime el resumen, vacía la cola y regresa [resultado por clave]
+        if not self.tasks:
+            return []
+        self.results = [False] * len(self.tasks)
+        self.tasks.sort(key=lambda task: task[0])  # archivos pequeños primero
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._run_one, self.tasks))
+        elapsed = time.perf_counter() - start
+        mb = self.bytes_done / (1024 * 1024)
+        print(f"Transferencias: {self.done} correctas, {self.failed} fallidas, "
+              f"{mb:.2f} MB en {elapsed:.2f} s ({mb / elapsed if elapsed else 0:.2f} MB/s)")
+        self.tasks = []
+        return self.results
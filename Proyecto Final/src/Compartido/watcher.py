@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import errno
+import select
+import threading
+import struct
+import ctypes
+import ctypes.util
+
+DEBOUNCE = 0.25  # segundos sin eventos antes de entregar el lote de cambios
+MAX_DEBOUNCE = 1.0  # segundos máximos que se junta una ráfaga, aunque los eventos no paren
+
+# Constantes de inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+'''Watcher basado en inotify de Linux, usado con ctypes sobre libc (sin dependencias externas). Pone un watch
+por carpeta, incluidas las que se crean después, y convierte los eventos en un conjunto de rutas relativas
+sucias. wait() bloquea sin gastar CPU hasta el primer evento y después espera DEBOUNCE segundos sin eventos
+para entregar juntos todos los cambios de una misma ráfaga (por ejemplo, un archivo que se escribe por partes).
+Una ráfaga se junta a lo más MAX_DEBOUNCE segundos, así un archivo que se modifica sin parar no detiene la sincronización.
+Otro hilo puede interrumpir la espera con wake() (por ejemplo, cuando el servidor avisa de cambios remotos).'''
+class InotifyWatcher:
+    name = "inotify"
+    event_driven = True
+
+    def __init__(self, root, ignore=None):
+        self.root = os.fspath(root)
+        self.ignore = ignore or (lambda name: False)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.wds = {}  # wd -> ruta relativa de la carpeta vigilada ("" es la raíz)
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.overflow = False
+        self._add_tree("", strict=True)
+
+    def _add_watch(self, rel, strict=False):
+        path = os.path.join(self.root, rel) if rel else self.root
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if strict:
+                raise OSError(err, f"inotify_add_watch: {path}")
+            if err == errno.ENOSPC:
+                self.overflow = True  # se acabaron los watches: el siguiente ciclo hace un recorrido completo
+            return
+        self.wds[wd] = rel
+
+    def _add_tree(self, rel, strict=False): #Vigila una carpeta y todas sus subcarpetas
+        self._add_watch(rel, strict)
+        base = os.path.join(self.root, rel) if rel else self.root
+        for root, dirs, _ in os.walk(base):
+            dirs[:] = [d for d in dirs if not self.ignore(d)]
+            for d in dirs:
+                self._add_watch(os.path.relpath(os.path.join(root, d), self.root).replace(os.sep, "/"), strict)
+
+    def _remove_tree(self, rel): #Quita los watches de una carpeta que se movió: su wd seguiría reportando la ruta vieja
+        prefix = rel + "/"
+        for wd, watched in list(self.wds.items()):
+            if watched == rel or watched.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.wds[wd]
+
+    def _read_events(self, dirty): #Lee los eventos disponibles y agrega sus rutas a dirty
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self.wds.pop(wd, None)
+                continue
+            parent = self.wds.get(wd)
+            if parent is None or not name or self.ignore(name):
+                continue
+            rel = f"{parent}/{name}" if parent else name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(rel)  # los archivos que ya tenga se recorren al sincronizar la carpeta
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(rel)
+            dirty.add(rel)
+
+    '''Espera hasta timeout segundos por cambios. Regresa el conjunto de rutas relativas que cambiaron (vacío si
+    no hubo eventos o si la espera se interrumpió con wake()) o None si se perdieron eventos y hay que revisar
+    todo el árbol.'''
+    def wait(self, timeout):
+        dirty = set()
+        woken = False
+        deadline = time.monotonic() + timeout
+        while not dirty and not woken and not self.overflow:  # eventos de archivos ignorados no cuentan como cambio
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self.fd, self.wake_r], [], [], remaining)
+            if self.wake_r in ready:
+                woken = self._drain_wake()
+            limit = min(deadline, time.monotonic() + MAX_DEBOUNCE)
+            while self.fd in ready:
+                self._read_events(dirty)
+                pause = min(DEBOUNCE, limit - time.monotonic())
+                if woken or pause <= 0:
+                    break
+                ready, _, _ = select.select([self.fd, self.wake_r], [], [], pause)
+                if self.wake_r in ready:
+                    woken = self._drain_wake()
+        if self.overflow:
+            self.overflow = False
+            return None
+        return dirty
+
+    def _drain_wake(self):
+        try:
+            while os.read(self.wake_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def wake(self): #Interrumpe wait() desde otro hilo
+        try:
+            os.write(self.wake_w, b"\0")
+        except BlockingIOError:
+            pass  # el pipe ya tiene un aviso pendiente
+
+    def close(self):
+        os.close(self.fd)
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+'''Respaldo para sistemas sin inotify (Windows, macOS): solo espera el intervalo y pide un recorrido completo,
+que es el comportamiento original del cliente. wake() termina la espera antes con un conjunto vacío.'''
+class PollingWatcher:
+    name = "sondeo"
+    event_driven = False
+
+    def __init__(self, root, ignore=None):
+        self.root = root
+        self.woken = threading.Event()
+
+    def wait(self, timeout):
+        if self.woken.wait(timeout):
+            self.woken.clear()
+            return set()
+        return None
+
+    def wake(self):
+        self.woken.set()
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, ignore=None): #Usa inotify si está disponible y, si no, el respaldo por sondeo
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, ignore)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(root, ignore)
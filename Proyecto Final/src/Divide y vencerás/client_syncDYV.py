@@ -1,29 +1,36 @@
 import os
 import time
-import hashlib
 import json
-import requests
+import hashlib
+import threading
 from pathlib import Path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Compartido"))  # módulos compartidos por las tres versiones
+from hashing import calc_sha256, hash_files
+from chunking import chunk_file, DELTA_MIN_SIZE
+from transfer import make_session, TransferQueue, UPLOAD_BLOCK, DOWNLOAD_BLOCK
+from watcher import make_watcher
+from batching import write_frames, read_frames, make_batches, BATCH_MAX_FILE
+from compression import compress_blocks, DecodedStream, pick_codec, worth_compressing, already_compressed, compression_stats, reset_compression_stats
 
 SERVER_URL = "http://192.168.100.8:5000"
 LOCAL_DIR = Path("C:/ADA/SYNC")
 SNAPSHOT_FILE = LOCAL_DIR / ".snapshot_local.json"
+REMOTE_STATE_FILE = LOCAL_DIR / ".snapshot_remote.json"
+RACY_WINDOW_NS = 1_000_000_000  # archivos modificados hace menos de 1 s se vuelven a hashear en el siguiente ciclo
 POLL_INTERVAL = 10
+LONG_POLL = 30  # segundos que el servidor retiene la consulta de cambios remotos
+FULL_SCAN_INTERVAL = 600  # recorrido completo de respaldo cada 10 min aunque el watcher no reporte cambios
+PART_MAX_AGE = 24 * 3600  # descargas incompletas se conservan un día para poder retomarlas
 
 LOCAL_DIR.mkdir(exist_ok=True)
-BLOCK_SIZE = 4 * 1024  # 4 KB
+session = make_session()  # conexiones keep-alive compartidas por todas las transferencias
+notify_session = make_session(1)  # conexión aparte para esperar cambios remotos
+server_codec = None  # códec con el que el servidor acepta subidas comprimidas (su Accept-Encoding)
 
-'''Función que realiza el calculo del hash de los archivos, se implementa DYV, recibe una ruta de un archivo
-lo abre en modo lectura y lo va leyendo por bloques fijos de 4 Kb'''
-def calc_sha256(path): 
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            block = f.read(BLOCK_SIZE)
-            if not block:
-                break
-            h.update(block)
-    return h.hexdigest()
+
+def ignored(name): #Archivos propios del sincronizador, que no se sincronizan ni despiertan al watcher
+    return name.startswith(".snapshot")
 
 def load_snapshot(): #retorna el archivo json en modo lectura
     if SNAPSHOT_FILE.exists():
@@ -35,87 +42,434 @@ def save_snapshot(snapshot): #Abre el archivo json en modo escritura y escribe l
     with open(SNAPSHOT_FILE, "w") as f:
         json.dump(snapshot, f, indent=2)
 
-'''Realiza el snapshot local. Utiliza fuerza bruta os.walk recorre todas las carpetas para obtener las rutas y tamaños de 
-los archivos que se encuentran en el servidor, crea el snap guardando el tamaño, tiempo y hash de todos los archivos contenidos'''
+'''Entrada del snapshot local: firma del archivo (tamaño, mtime_ns, inodo) y su hash. Si el archivo se modificó
+dentro de la ventana RACY_WINDOW_NS se marca como racy, porque otra escritura en el mismo instante podría no
+cambiar el mtime, y su hash no se reutiliza en el siguiente ciclo.'''
+def stat_entry(st, file_hash, now_ns):
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "ino": st.st_ino,
+        "hash": file_hash,
+        "racy": now_ns - st.st_mtime_ns < RACY_WINDOW_NS
+    }
+
+def cached_hash(prev, st): #Regresa el hash del snapshot anterior si la firma no cambió y no era racy
+    if not isinstance(prev, dict) or prev.get("racy", True) or not prev.get("hash"):
+        return None
+    if (prev.get("size"), prev.get("mtime_ns"), prev.get("ino")) != (st.st_size, st.st_mtime_ns, st.st_ino):
+        return None
+    return prev["hash"]
 
-def build_local_snapshot():
+def add_entry(snap, pending, prev_snap, rel_path, now_ns): #Agrega un archivo al snapshot reutilizando su hash si sigue vigente; si no, lo deja pendiente
+    try:
+        st = (LOCAL_DIR / rel_path).stat()
+    except OSError:
+        return
+    prev = prev_snap.get(rel_path)
+    file_hash = cached_hash(prev, st)
+    snap[rel_path] = stat_entry(st, file_hash, now_ns)
+    if file_hash is None:
+        pending.append(rel_path)
+    elif "chunks" in prev:
+        snap[rel_path]["chunks"] = prev["chunks"]
+
+def hash_pending(snap, pending): #Calcula en paralelo los hashes pendientes y los acomoda en el snapshot
+    hashes = hash_files([LOCAL_DIR / rel for rel in pending], calc_sha256)
+    for rel_path, file_hash in zip(pending, hashes):
+        if file_hash is None:
+            del snap[rel_path]  # el archivo desapareció o no se pudo leer
+        else:
+            snap[rel_path]["hash"] = file_hash
+
+'''Realiza el snapshot local. Utiliza fuerza bruta os.walk recorre todas las carpetas para obtener las rutas y tamaños de 
+los archivos, pero solo calcula el hash de los archivos cuya firma (tamaño, mtime_ns, inodo) cambió respecto al snapshot anterior.
+Los hashes pendientes se calculan en paralelo y se acomodan en el snapshot en el mismo orden del recorrido.'''
+def build_local_snapshot(prev_snap):
     snap = {}
+    pending = []
+    now_ns = time.time_ns()
     for root, _, files in os.walk(LOCAL_DIR):
         for f in files:
             if f.startswith(".snapshot"):
                 continue
-            full_path = Path(root) / f
-            rel_path = full_path.relative_to(LOCAL_DIR).as_posix()
-            st = full_path.stat()
-            snap[rel_path] = {
-                "size": st.st_size,
-                "mtime": st.st_mtime,
-                "hash": calc_sha256(full_path)
-            }
+            rel_path = (Path(root) / f).relative_to(LOCAL_DIR).as_posix()
+            add_entry(snap, pending, prev_snap, rel_path, now_ns)
+
+    hash_pending(snap, pending)
     return snap
 
-def upload_file(rel_path): #Subir archivos que se encuentran nuevos
+'''Snapshot local incremental a partir de las rutas que reportó el watcher, sin recorrer toda la carpeta.
+Se revisan las rutas sucias (si son carpetas, todo lo que contienen), lo que había debajo de una ruta que ya no
+es un archivo conocido (carpetas borradas o movidas) y las entradas racy del ciclo anterior; el resto del
+snapshot anterior se conserva tal cual.'''
+def update_local_snapshot(prev_snap, dirty):
+    stale = set(dirty)
+    stale.update(rel for rel, entry in prev_snap.items() if entry.get("racy"))
+    prefixes = tuple(rel + "/" for rel in dirty if rel not in prev_snap)
+    if prefixes:
+        stale.update(rel for rel in prev_snap if rel.startswith(prefixes))
+    check = set()
+    for rel in stale:
+        path = LOCAL_DIR / rel
+        if path.is_dir():
+            for root, _, files in os.walk(path):
+                check.update((Path(root) / f).relative_to(LOCAL_DIR).as_posix() for f in files if not ignored(f))
+        elif not ignored(path.name):
+            check.add(rel)
+    snap = {rel: entry for rel, entry in prev_snap.items() if rel not in stale and rel not in check}
+    pending = []
+    now_ns = time.time_ns()
+    for rel_path in sorted(check):
+        add_entry(snap, pending, prev_snap, rel_path, now_ns)
+    hash_pending(snap, pending)
+    return snap
+
+def downloaded_entry(rel_path, rhash): #Entrada para un archivo recién descargado, con el hash que reporta el servidor
+    try:
+        st = (LOCAL_DIR / rel_path).stat()
+    except OSError:
+        return {"hash": rhash}
+    return stat_entry(st, rhash, time.time_ns())
+
+def load_remote_state(): #Cursor del diario del servidor (epoch, seq) y la copia local del snapshot remoto
+    if REMOTE_STATE_FILE.exists():
+        with open(REMOTE_STATE_FILE, "r") as f:
+            return json.load(f)
+    return {"epoch": "", "seq": 0, "snapshot": {}, "sizes": {}}
+
+def save_remote_state(state):
+    with open(REMOTE_STATE_FILE, "w") as f:
+        json.dump(state, f)
+
+'''Obtiene el snapshot remoto pidiendo al servidor solo los cambios posteriores al cursor guardado y
+aplicándolos a la copia local. Solo cuando el servidor responde reset (diario compactado o reiniciado)
+se recibe el snapshot completo. Regresa también los tamaños remotos, que sirven para ordenar las descargas.'''
+def fetch_remote_snapshot():
+    global server_codec
+    state = load_remote_state()
+    r = session.get(f"{SERVER_URL}/changes", params={"since": state["seq"], "epoch": state["epoch"]})
+    server_codec = pick_codec(r.headers.get("Accept-Encoding"))
+    delta = r.json()
+    if delta["reset"]:
+        remote_snap = delta["snapshot"]
+        remote_sizes = delta.get("sizes", {})
+    else:
+        remote_snap = state["snapshot"]
+        remote_sizes = state.get("sizes", {})
+        for change in delta["changes"]:
+            if change["op"] == "delete":
+                remote_snap.pop(change["path"], None)
+                remote_sizes.pop(change["path"], None)
+            else:
+                remote_snap[change["path"]] = change["hash"]
+                remote_sizes[change["path"]] = change.get("size", 0)
+    if delta["reset"] or delta["changes"]:
+        save_remote_state({"epoch": delta["epoch"], "seq": delta["seq"], "snapshot": remote_snap, "sizes": remote_sizes})
+    return remote_snap, remote_sizes
+
+'''Hilo que se queda esperando en el servidor (long-poll a /changes) y despierta al ciclo principal en cuanto
+hay cambios remotos. Lleva su propio cursor, solo para saber desde dónde esperar: quien aplica los cambios es
+sync() con fetch_remote_snapshot.'''
+def watch_remote(watcher):
+    state = load_remote_state()
+    since, epoch = state["seq"], state["epoch"]
+    while True:
+        try:
+            r = notify_session.get(f"{SERVER_URL}/changes", params={"since": since, "epoch": epoch, "wait": LONG_POLL},
+                                   timeout=LONG_POLL + 10)
+            delta = r.json()
+        except Exception:
+            time.sleep(POLL_INTERVAL)  # servidor no disponible: se vuelve a intentar más tarde
+            continue
+        if delta["reset"] or delta["changes"]:
+            since, epoch = delta["seq"], delta["epoch"]
+            watcher.wake()
+
+def delta_body(full_path, manifest, missing): #Cuerpo de /upload_delta: largo del manifiesto, manifiesto y bloques faltantes
+    header = json.dumps(manifest).encode("utf-8")
+    yield len(header).to_bytes(4, "big")
+    yield header
+    with open(full_path, "rb") as f:
+        for chunk_hash, length in manifest["chunks"]:
+            if chunk_hash in missing:
+                yield f.read(length)
+            else:
+                f.seek(length, os.SEEK_CUR)
+
+'''Sube solo los bloques que el servidor no tiene de un archivo que ya existe allá. La lista de bloques se guarda
+en la entrada del snapshot local para no volver a dividir el archivo mientras no cambie. Regresa False si conviene
+subir el archivo completo (el servidor no tiene ningún bloque o la reconstrucción falló).'''
+def upload_delta(rel_path, local_data):
     full_path = LOCAL_DIR / rel_path
     try:
+        if "chunks" not in local_data:
+            local_data["chunks"] = chunk_file(full_path)
+        chunks = local_data["chunks"]
+        r = session.post(f"{SERVER_URL}/chunks/missing", json={"path": rel_path, "chunks": chunks})
+        missing = set(r.json()["missing"])
+        if len(missing) == len({chunk_hash for chunk_hash, _ in chunks}):
+            return False
+        manifest = {"path": rel_path, "hash": local_data["hash"], "chunks": chunks}
+        r = session.post(f"{SERVER_URL}/upload_delta", data=delta_body(full_path, manifest, missing))
+        sent = sum(length for chunk_hash, length in chunks if chunk_hash in missing)
+        print(f"Subido por bloques: {rel_path} ({len(missing)}/{len(chunks)} bloques, {sent} bytes) ({r.status_code})")
+        return r.status_code == 200
+    except Exception as e:
+        print(f"Error subiendo por bloques {rel_path}: {e}")
+        return False
+
+def link_remote_file(rel_path, file_hash): #Si el servidor ya tiene ese contenido, solo le pide crear la ruta
+    try:
+        r = session.head(f"{SERVER_URL}/blob/{file_hash}")
+        if r.status_code != 200:
+            return False
+        r = session.post(f"{SERVER_URL}/link", json={"path": rel_path, "hash": file_hash})
+        print(f"Enlazado en servidor: {rel_path} ({r.status_code})")
+        return r.status_code == 200
+    except Exception as e:
+        print(f"Error enlazando {rel_path}: {e}")
+        return False
+
+def file_blocks(f): #Lee un archivo abierto en bloques de UPLOAD_BLOCK para mandarlo como stream
+    while True:
+        block = f.read(UPLOAD_BLOCK)
+        if not block:
+            return
+        yield block
+
+'''Sube un archivo completo como stream a /upload_stream. Primero pregunta cuántos bytes de esta misma versión
+(ruta + hash) tiene el servidor de un intento anterior y continúa desde ahí; el servidor verifica el sha256
+antes de ponerlo en su lugar. Si la subida se corta, el reintento de la cola la retoma.'''
+def upload_stream(rel_path, local_data):
+    url = f"{SERVER_URL}/upload_stream/{rel_path}"
+    file_hash = local_data["hash"]
+    r = session.head(url, params={"hash": file_hash})
+    offset = int(r.headers.get("Upload-Offset", 0))
+    size = local_data["size"]
+    if offset:
+        print(f"Retomando subida de {rel_path} desde {offset} bytes")
+    codec = server_codec if worth_compressing(LOCAL_DIR / rel_path) else None
+    with open(LOCAL_DIR / rel_path, "rb") as f:
+        f.seek(offset)
+        headers = {"Content-Range": f"bytes {offset}-{max(size - 1, offset)}/{size}", "X-Content-SHA256": file_hash}
+        body = file_blocks(f)
+        if codec:
+            headers["Content-Encoding"] = codec
+            body = compress_blocks(body, codec)
+        r = session.put(url, data=body, headers=headers)
+    print(f"Subido: {rel_path} ({r.status_code})")
+    return r.status_code == 200
+
+def upload_file(rel_path, local_data=None, remote_hash=None): #Subir archivos que se encuentran nuevos
+    full_path = LOCAL_DIR / rel_path
+    if local_data and link_remote_file(rel_path, local_data["hash"]):
+        return True
+    if remote_hash and local_data and local_data.get("size", 0) >= DELTA_MIN_SIZE:
+        if upload_delta(rel_path, local_data):
+            return True
+    try:
+        if local_data:
+            return upload_stream(rel_path, local_data)
         with open(full_path, "rb") as f:
-            r = requests.post(f"{SERVER_URL}/upload", files={"file": (rel_path, f)})
+            r = session.post(f"{SERVER_URL}/upload", files={"file": (rel_path, f)})
             print(f"Subido: {rel_path} ({r.status_code})")
+            return r.status_code == 200
     except Exception as e:
         print(f"Error subiendo {rel_path}: {e}")
+    return False
+
+def local_path(rel_path): #Ruta dentro de LOCAL_DIR para una ruta que manda el servidor; None si es absoluta o sale de LOCAL_DIR
+    root = os.path.normpath(LOCAL_DIR.absolute())
+    path = os.path.normpath(os.path.join(root, rel_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        return None
+    return Path(path)
+
+def partial_download(rel_path, rhash): #Temporal de la descarga de esa versión (ruta + hash); empieza con .snapshot para que no se sincronice
+    key = hashlib.sha256(f"{rel_path}\0{rhash}".encode("utf-8")).hexdigest()
+    return LOCAL_DIR / f".snapshot_{key[:32]}.part"
 
-def download_file(rel_path): #Descargar archivos del servidor que no estan en local
-    save_path = LOCAL_DIR / rel_path
-    os.makedirs(save_path.parent, exist_ok=True)
+def clean_partials(): #Borra descargas incompletas que no se retomaron en PART_MAX_AGE segundos
+    limit = time.time() - PART_MAX_AGE
+    for part in LOCAL_DIR.glob(".snapshot_*.part"):
+        try:
+            if part.stat().st_mtime < limit:
+                part.unlink()
+        except OSError:
+            pass
+
+'''Descarga un archivo del servidor a un temporal .part y solo al terminar lo mueve a su ruta, así una descarga
+cortada nunca deja un archivo truncado que el siguiente ciclo tome como modificación local. Si ya hay una parte
+de esa misma versión se pide solo el resto con Range. El sha256 se calcula mientras se escribe y se compara con
+el del snapshot remoto antes de reemplazar el archivo.'''
+def download_file(rel_path, rhash):
+    save_path = local_path(rel_path)
+    if save_path is None:
+        print(f"Ruta inválida en el snapshot remoto: {rel_path}")
+        return False
+    part_path = partial_download(rel_path, rhash)
+    offset = part_path.stat().st_size if part_path.exists() else 0
     try:
-        r = requests.get(f"{SERVER_URL}/download/{rel_path}", stream=True)
-        if r.status_code == 200:
-            with open(save_path, "wb") as f:
-                for chunk in r.iter_content(8192):
-                    f.write(chunk)
-            print(f"Descargado: {rel_path}")
-        else:
-            print(f"Error descargando {rel_path}: {r.status_code}")
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with session.get(f"{SERVER_URL}/download/{rel_path}", headers=headers, stream=True) as r:
+            if r.status_code == 416:
+                part_path.unlink()  # la parte guardada ya no corresponde al archivo del servidor
+                return False
+            if r.status_code in (200, 206):
+                resumed = r.status_code == 206
+                h = hashlib.sha256()
+                if resumed:
+                    with open(part_path, "rb") as f:
+                        for block in iter(lambda: f.read(DOWNLOAD_BLOCK), b""):
+                            h.update(block)
+                stream = DecodedStream(r.raw, r.headers.get("Content-Encoding"))
+                with open(part_path, "ab" if resumed else "wb") as f:
+                    for chunk in iter(lambda: stream.read(DOWNLOAD_BLOCK), b""):
+                        f.write(chunk)
+                        h.update(chunk)
+                if h.hexdigest() != rhash:
+                    part_path.unlink()
+                    print(f"El hash no coincide con el del servidor: {rel_path}")
+                    return False
+                os.makedirs(save_path.parent, exist_ok=True)
+                os.replace(part_path, save_path)
+                print(f"Descargado: {rel_path}")
+                return True
+            else:
+                print(f"Error descargando {rel_path}: {r.status_code}")
     except Exception as e:
         print(f"Error descargando {rel_path}: {e}")
+    return False
+
+def upload_batch(rel_paths): #Sube varios archivos pequeños en una sola petición
+    try:
+        body = write_frames((rel, LOCAL_DIR / rel) for rel in rel_paths)
+        headers = {}
+        if server_codec and not all(already_compressed(rel) for rel in rel_paths):
+            headers["Content-Encoding"] = server_codec
+            body = compress_blocks(body, server_codec)
+        r = session.post(f"{SERVER_URL}/upload_batch", data=body, headers=headers)
+        saved = r.json().get("saved", [])
+        print(f"Lote subido: {len(saved)}/{len(rel_paths)} archivos ({r.status_code})")
+        return r.status_code == 200
+    except Exception as e:
+        print(f"Error subiendo lote de {len(rel_paths)} archivos: {e}")
+    return False
+
+'''Descarga varios archivos pequeños en una sola petición y regresa el conjunto de rutas que sí llegaron. Solo se
+guardan los marcos de rutas que se pidieron y que quedan dentro de LOCAL_DIR; cada archivo se escribe en un
+temporal .part y se mueve con os.replace, así un lote cortado no deja archivos truncados.'''
+def download_batch(rel_paths):
+    wanted = set(rel_paths)
+    received = set()
+    try:
+        with session.post(f"{SERVER_URL}/download_batch", json={"paths": rel_paths}, stream=True) as r:
+            if r.status_code != 200:
+                print(f"Error descargando lote: {r.status_code}")
+                return received
+            stream = DecodedStream(r.raw, r.headers.get("Content-Encoding"))
+            for header, data in read_frames(stream):
+                rel = header["path"]
+                save_path = local_path(rel) if rel in wanted else None
+                if save_path is None:
+                    print(f"Ruta inesperada en el lote: {rel}")
+                    continue
+                part_path = partial_download(rel, header["hash"])
+                with open(part_path, "wb") as f:
+                    f.write(data)
+                os.makedirs(save_path.parent, exist_ok=True)
+                os.replace(part_path, save_path)
+                received.add(rel)
+            print(f"Lote descargado: {len(received)}/{len(rel_paths)} archivos")
+    except Exception as e:
+        print(f"Error descargando lote de {len(rel_paths)} archivos: {e}")
+    return received
+
+def queue_batches(queue, items, func): #Agrupa archivos pequeños [(ruta, tamaño)] en lotes, los agrega a la cola y regresa {ruta: clave del lote}
+    sizes = dict(items)
+    keys = {}
+    for batch in make_batches(items):
+        key = queue.add(f"lote de {len(batch)} archivos", sum(sizes[rel] for rel in batch), func, batch)
+        keys.update((rel, key) for rel in batch)
+    return keys
 
 def delete_remote_file(rel_path): #Elimina los archivos que no se encuentran en local del servidor
     try:
-        r = requests.delete(f"{SERVER_URL}/delete/{rel_path}")
+        r = session.delete(f"{SERVER_URL}/delete/{rel_path}")
+        if r.status_code == 404:
+            return True  # ya no existía en el servidor
         if r.status_code == 200:
             print(f"Eliminado en servidor: {rel_path}")
+            return True
     except Exception as e:
         print(f"Error eliminando {rel_path} en servidor: {e}")
+    return False
 
 
-def sync():
-    local_snap = build_local_snapshot()
+def sync(dirty=None): #dirty=None revisa toda la carpeta; un conjunto de rutas revisa solo esas
+    snapshot = load_snapshot()
+    if dirty is None:
+        local_snap = build_local_snapshot(snapshot)
+    else:
+        local_snap = update_local_snapshot(snapshot, dirty)
     try:
-        remote_snap = requests.get(f"{SERVER_URL}/snapshot").json()
+        remote_snap, remote_sizes = fetch_remote_snapshot()
     except Exception as e:
         print(f"No se pudo obtener snapshot remoto: {e}")
-        remote_snap = {}
+        remote_snap, remote_sizes = {}, {}
 
-    snapshot = load_snapshot()
     new_snapshot = {}
+    queue = TransferQueue()
+    downloads = []  # (ruta, hash, clave de la tarea que la descarga)
+    small_uploads = []
+    small_downloads = []
+    deleted = set()
 
     # 1) Archivos nuevos/modificados localmente
     for rel, local_data in local_snap.items():
         remote_hash = remote_snap.get(rel)
         local_hash = local_data["hash"]
         if remote_hash != local_hash:
-            upload_file(rel)
-        new_snapshot[rel] = local_hash
+            if local_data["size"] <= BATCH_MAX_FILE:
+                small_uploads.append((rel, local_data["size"]))
+            else:
+                queue.add(rel, local_data["size"], upload_file, rel, local_data, remote_hash)
+        new_snapshot[rel] = local_data
 
     # 2) Archivos eliminados localmente
     for rel in snapshot:
         if rel not in local_snap and rel in remote_snap:
-            delete_remote_file(rel)
+            queue.add(rel, 0, delete_remote_file, rel)
+            deleted.add(rel)
 
     # 3) Archivos nuevos/modificados en servidor
     for rel, rhash in remote_snap.items():
-        if rel not in new_snapshot:
-            download_file(rel)
-            new_snapshot[rel] = rhash
+        if rel not in new_snapshot and rel not in deleted:
+            if remote_sizes.get(rel, BATCH_MAX_FILE + 1) <= BATCH_MAX_FILE:
+                small_downloads.append((rel, remote_sizes[rel]))
+                downloads.append((rel, rhash, None))
+            else:
+                downloads.append((rel, rhash, queue.add(rel, remote_sizes.get(rel, 0), download_file, rel, rhash)))
+
+    # Archivos pequeños: una petición por lote en lugar de una por archivo
+    queue_batches(queue, small_uploads, upload_batch)
+    batch_keys = queue_batches(queue, small_downloads, download_batch)
+
+    # Todas las transferencias en paralelo, las más pequeñas primero
+    results = queue.run()
+    stats = compression_stats()
+    if stats["raw"]:
+        saved = stats["raw"] - stats["wire"]
+        print(f"Compresión: {saved / (1024 * 1024):.2f} MB ahorrados de {stats['raw'] / (1024 * 1024):.2f} MB "
+              f"({saved * 100 / stats['raw']:.1f}%) en {stats['seconds']:.2f} s de CPU")
+        reset_compression_stats()
+    # Solo las descargas que terminaron entran al snapshot: si una ruta fallida quedara registrada, el siguiente
+    # ciclo la tomaría como borrada localmente y la eliminaría del servidor
+    for rel, rhash, key in downloads:
+        done = results[key] if key is not None else rel in (results[batch_keys[rel]] or ())
+        if done:
+            new_snapshot[rel] = downloaded_entry(rel, rhash)
 
     save_snapshot(new_snapshot)
     print("Sincronización completada.\n")
@@ -123,12 +477,25 @@ def sync():
 
 def main():
     print(f"Sincronizador activo en {LOCAL_DIR.resolve()}")
+    clean_partials()
+    watcher = make_watcher(LOCAL_DIR, ignored)
+    print(f"Detección de cambios: {watcher.name}")
     try:
+        sync()
+        threading.Thread(target=watch_remote, args=(watcher,), daemon=True).start()
+        last_full = time.time()
         while True:
-            sync()
-            time.sleep(POLL_INTERVAL)
+            # con inotify solo despierta por eventos locales o avisos del servidor; el sondeo revisa cada POLL_INTERVAL
+            dirty = watcher.wait(FULL_SCAN_INTERVAL if watcher.event_driven else POLL_INTERVAL)
+            if time.time() - last_full >= FULL_SCAN_INTERVAL:
+                dirty = None
+            if dirty is None:
+                last_full = time.time()
+            sync(dirty)
     except KeyboardInterrupt:
         print("Sincronizador detenido.")
+    finally:
+        watcher.close()
 
 if __name__ == "__main__":
     main()
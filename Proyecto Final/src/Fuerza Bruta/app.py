@@ -1,7 +1,21 @@
-from flask import Flask, request, send_from_directory, jsonify, render_template, redirect, url_for
-import os, hashlib, json
+from flask import Flask, request, send_from_directory, send_file, jsonify, render_template, redirect, url_for, Response
+import os, re, io, json, time
+import hashlib
 from pathlib import Path
+from urllib.parse import quote
 import shutil
+import uuid
+import zipfile
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.security import safe_join
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Compartido"))  # módulos compartidos por las tres versiones
+from snapshot_index import SnapshotIndex
+from hashing import calc_sha256
+from chunking import assemble_file
+from batching import read_frames, write_frames
+from compression import CODECS, DecodedStream, accept_encoding, pick_codec, worth_compressing, already_compressed, compress_blocks, read_blocks
+from blob_store import BlobStore, is_sha256
 
 app = Flask(__name__)
 
@@ -9,54 +23,306 @@ app = Flask(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = Path(os.path.join(BASE_DIR, "uploads"))
 UPLOAD_FOLDER.mkdir(exist_ok=True, parents=True)
-SNAPSHOT_FILE = os.path.join(BASE_DIR, "snapshot.json")
+INDEX_FILE = os.path.join(BASE_DIR, "snapshot_index.json")
+TMP_FOLDER = Path(os.path.join(BASE_DIR, "tmp"))
+TMP_FOLDER.mkdir(exist_ok=True, parents=True)
+BLOBS_FOLDER = os.path.join(BASE_DIR, "blobs")
+UPLOAD_BLOCK = 1024 * 1024  # bloque de lectura/escritura de las subidas
+PART_MAX_AGE = 24 * 3600  # subidas incompletas se conservan un día para poder retomarlas
+LONG_POLL_TIMEOUT = 60  # segundos máximos que /changes retiene una petición
+BLOB_STORE = True  # guarda cada contenido una sola vez y enlaza las rutas duplicadas
+SHARED_DIR = os.path.join(BASE_DIR, "..", "Compartido")
+CLIENT_MODULES = ("hashing", "chunking", "transfer", "watcher", "batching", "compression")  # módulos compartidos que importa el cliente
+CLIENT_FILES = [os.path.join(BASE_DIR, "client_sync.py")] + \
+    [os.path.join(SHARED_DIR, f"{name}.py") for name in CLIENT_MODULES]
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 
-def calc_sha256(path): #calcula hash del archivo
-    """Calcula el hash SHA256 completo del archivo."""
+store = BlobStore(BLOBS_FOLDER) if BLOB_STORE else None
+snap_index = SnapshotIndex(UPLOAD_FOLDER, INDEX_FILE, calc_sha256, store=store)
+
+def rel_of(path): #Ruta relativa a la carpeta uploads
+    return Path(os.path.normpath(path)).relative_to(UPLOAD_FOLDER).as_posix()
+
+'''Ruta absoluta dentro de uploads/ para una ruta relativa que manda un cliente. Regresa None si la ruta es
+absoluta, sube con .. o apunta a la carpeta uploads misma, así ninguna petición escribe ni lee fuera de ella.'''
+def upload_path(rel):
+    if not isinstance(rel, str):
+        return None
+    path = safe_join(str(UPLOAD_FOLDER), rel.replace("\\", "/"))
+    if path is None or os.path.normpath(path) == str(UPLOAD_FOLDER):
+        return None
+    return Path(os.path.normpath(path))
+
+'''Actualiza el snapshot solo con las rutas que se subieron o eliminaron, sin volver a hashear
+todo el árbol; el resto del índice se revalida por stat en /snapshot. Las rutas de hashed {ruta: hash}
+ya se hashearon al recibirlas y se indexan sin volver a leerlas.'''
+def update_snapshot(changed=(), removed=(), hashed=None):
+    if removed:
+        snap_index.remove_paths(removed)
+    if changed:
+        snap_index.update_paths(changed)
+    if hashed:
+        snap_index.put_hashed(hashed)
+
+'''Guarda un archivo recibido en un temporal y lo mueve a su ruta con os.replace. Nunca se escribe sobre
+el archivo existente, porque con el almacén de blobs puede ser un enlace compartido con otras rutas.
+El sha256 se calcula mientras se escribe y se regresa, así el archivo no se vuelve a leer para indexarlo.'''
+def save_upload(file, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = TMP_FOLDER / f"{uuid.uuid4().hex}.part"
     h = hashlib.sha256()
-    with open(path, "rb") as f:
-        h.update(f.read())  # leer todo el archivo de una vez
+    with open(tmp, "wb") as f:
+        for block in iter(lambda: file.stream.read(UPLOAD_BLOCK), b""):
+            f.write(block)
+            h.update(block)
+    os.replace(tmp, path)
     return h.hexdigest()
 
-def load_snapshot(): #retorna el archivo json en modo lectura
-    if os.path.exists(SNAPSHOT_FILE):
-        with open(SNAPSHOT_FILE, "r") as f:
-            return json.load(f)
-    return {}
+def save_bytes(data, path): #Igual que save_upload pero con el contenido ya en memoria (archivos de un lote)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = TMP_FOLDER / f"{uuid.uuid4().hex}.part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
 
-def save_snapshot(snapshot): #Abre el archivo json en modo escritura y escribe lo que le pasen
-    with open(SNAPSHOT_FILE, "w") as f:
-        json.dump(snapshot, f, indent=2)
+def partial_path(rel, file_hash): #Temporal de una subida por stream; depende de la ruta y del hash para poder retomarla
+    key = hashlib.sha256(f"{rel}\0{file_hash}".encode("utf-8")).hexdigest()
+    return TMP_FOLDER / f"{key}.part"
 
-def update_snapshot():#Actualiza el snapshot con hashes nuevos
-    snapshot = {}
-    for path in UPLOAD_FOLDER.rglob("*"):
-        if path.is_file():
-            rel_path = path.relative_to(UPLOAD_FOLDER).as_posix()
-            snapshot[rel_path] = calc_sha256(path)
-    save_snapshot(snapshot)
+def clean_partials(): #Borra subidas incompletas que nadie retomó en PART_MAX_AGE segundos
+    limit = time.time() - PART_MAX_AGE
+    for part in TMP_FOLDER.glob("*.part"):
+        try:
+            if part.stat().st_mtime < limit:
+                part.unlink()
+        except OSError:
+            pass
 
+'''Si el cliente acepta alguno de nuestros códecs (Accept-Encoding), el archivo vale la pena comprimirlo y no es
+una petición Range, regresa una respuesta que envía el archivo comprimido como stream; si no, regresa None y se
+usa send_from_directory. Las descargas retomadas con Range siempre van sin comprimir.'''
+def compressed_download(abs_path, mimetype="application/octet-stream"):
+    codec = pick_codec(request.headers.get("Accept-Encoding"))
+    if codec is None or "Range" in request.headers or not worth_compressing(abs_path):
+        return None
+    response = Response(compress_blocks(read_blocks(abs_path), codec), mimetype=mimetype)
+    response.headers["Content-Encoding"] = codec
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(abs_path.name)}"
+    return response
+
+def refresh_snapshot(): #Revalida el índice por stat; el índice se guarda solo cuando algo cambió
+    snap_index.refresh()
+
+
+@app.after_request #Anuncia en cada respuesta los códecs con los que el servidor acepta cuerpos comprimidos
+def advertise_codecs(response):
+    response.headers["Accept-Encoding"] = accept_encoding()
+    return response
 
 @app.route("/upload", methods=["POST"]) #Guarda archivos en el servidor y actualiza el snapshot
 def upload_file():
     file = request.files["file"]
     path = os.path.join(UPLOAD_FOLDER, file.filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    file.save(path)
-    update_snapshot()
+    file_hash = save_upload(file, path)
+    update_snapshot(hashed={rel_of(path): file_hash})
+    return "Archivo recibido y guardado.", 200
+
+@app.route("/upload_stream/<path:filename>", methods=["HEAD"]) #Cuántos bytes de esa versión (ruta + hash) ya recibió el servidor
+def upload_offset(filename):
+    path = upload_path(filename)
+    if path is None:
+        return "", 400
+    part = partial_path(rel_of(path), request.args.get("hash", ""))
+    offset = part.stat().st_size if part.exists() else 0
+    return "", 200, {"Upload-Offset": str(offset)}
+
+'''Subida por stream y reanudable. El cliente manda el cuerpo crudo con X-Content-SHA256 y Content-Range
+(bytes inicio-fin/total); el contenido se agrega al temporal de esa ruta + hash mientras se calcula el sha256.
+Si la conexión se corta, lo recibido se queda en tmp/ y el cliente continúa desde Upload-Offset. Al completar
+el total se verifica el hash declarado y el archivo se mueve a su lugar de forma atómica.'''
+@app.route("/upload_stream/<path:filename>", methods=["PUT"])
+def upload_stream(filename):
+    path = upload_path(filename)
+    if path is None:
+        return "Ruta inválida", 400
+    rel = rel_of(path)
+    file_hash = request.headers.get("X-Content-SHA256", "")
+    match = re.match(r"bytes (\d+)-\d*/(\d+)", request.headers.get("Content-Range", ""))
+    if not file_hash or not match:
+        return "Faltan X-Content-SHA256 o Content-Range", 400
+    encoding = request.headers.get("Content-Encoding")
+    if encoding and encoding not in CODECS:
+        return f"Content-Encoding no soportado: {encoding}", 415
+    start, total = int(match.group(1)), int(match.group(2))
+    part = partial_path(rel, file_hash)
+    offset = part.stat().st_size if part.exists() else 0
+    if start != offset:
+        return "El inicio no coincide con lo recibido", 416, {"Upload-Offset": str(offset)}
+    h = hashlib.sha256()
+    if offset:
+        with open(part, "rb") as f:  # al retomar se rehashea solo lo que ya estaba en tmp/
+            for block in iter(lambda: f.read(UPLOAD_BLOCK), b""):
+                h.update(block)
+    body = DecodedStream(request.stream, encoding)  # el temporal siempre guarda los bytes sin comprimir
+    try:
+        with open(part, "ab") as f:
+            for block in iter(lambda: body.read(UPLOAD_BLOCK), b""):
+                f.write(block)
+                h.update(block)
+    except (ClientDisconnected, ValueError):
+        return "Subida interrumpida", 400, {"Upload-Offset": str(part.stat().st_size)}
+    received = part.stat().st_size
+    if received < total:
+        return "Subida incompleta", 400, {"Upload-Offset": str(received)}
+    if received > total or h.hexdigest() != file_hash:
+        part.unlink()
+        return "El hash del archivo recibido no coincide", 409
+    os.makedirs(path.parent, exist_ok=True)
+    os.replace(part, path)
+    update_snapshot(hashed={rel: file_hash})
     return "Archivo recibido y guardado.", 200
 
+@app.route("/blob/<file_hash>", methods=["HEAD"]) #Responde 200 si el servidor ya tiene un archivo con ese sha256
+def has_blob(file_hash):
+    if not is_sha256(file_hash):
+        return "", 400
+    return ("", 200) if snap_index.has_hash(file_hash) else ("", 404)
+
+'''Crea una ruta a partir de un blob que el servidor ya tiene ({path, hash}), así el cliente no sube
+un contenido que ya existe en el servidor con otro nombre.'''
+@app.route("/link", methods=["POST"])
+def link_blob():
+    data = request.get_json(silent=True)
+    path = upload_path(data.get("path")) if isinstance(data, dict) else None
+    if path is None or not is_sha256(data.get("hash")):
+        return "Ruta o hash inválido", 400
+    if not snap_index.has_hash(data["hash"]):
+        return "Blob no encontrado", 404
+    try:
+        snap_index.put_known(rel_of(path), data["hash"])
+    except (OSError, ValueError):
+        return "Blob no encontrado", 404  # se borró la última ruta con ese hash; el cliente sube el archivo completo
+    return "Archivo enlazado.", 200
+
+'''Recibe la lista de bloques [[sha256, tamaño], ...] de un archivo del cliente y responde cuáles no existen
+en la versión que tiene el servidor de ese mismo archivo.'''
+@app.route("/chunks/missing", methods=["POST"])
+def missing_chunks():
+    data = request.get_json()
+    path = upload_path(data["path"])
+    if path is None:
+        return "Ruta inválida", 400
+    have = {chunk_hash for chunk_hash, _ in snap_index.chunks_of(rel_of(path))}
+    missing = list(dict.fromkeys(chunk_hash for chunk_hash, _ in data["chunks"] if chunk_hash not in have))
+    return jsonify({"missing": missing})
+
+'''Subida por bloques. El cuerpo trae el largo del manifiesto (4 bytes), el manifiesto JSON {path, hash, chunks}
+y después solo los bloques faltantes en orden. El archivo se reconstruye en tmp/ copiando los bloques que ya
+estaban en la versión anterior, se verifica el hash completo y se reemplaza de forma atómica.'''
+@app.route("/upload_delta", methods=["POST"])
+def upload_delta():
+    stream = request.stream
+    size = int.from_bytes(stream.read(4), "big")
+    manifest = json.loads(stream.read(size))
+    path = upload_path(manifest["path"])
+    if path is None:
+        return "Ruta inválida", 400
+    rel = rel_of(path)
+    tmp = TMP_FOLDER / f"{uuid.uuid4().hex}.part"
+    try:
+        digest = assemble_file(manifest["chunks"], path, snap_index.chunks_of(rel), stream, tmp)
+        if digest != manifest["hash"]:
+            raise ValueError("el hash del archivo reconstruido no coincide")
+    except (ValueError, OSError) as e:
+        tmp.unlink(missing_ok=True)
+        return f"No se pudo reconstruir {rel}: {e}", 409
+    os.makedirs(path.parent, exist_ok=True)
+    os.replace(tmp, path)
+    update_snapshot(hashed={rel: digest})
+    snap_index.set_chunks(rel, manifest["chunks"])
+    return "Archivo reconstruido y guardado.", 200
+
+'''Subida por lotes de archivos pequeños: el cuerpo es un stream de marcos (batching.py) con varios archivos.
+Cada archivo se guarda en tmp/ y se mueve a su ruta, y el snapshot se actualiza una sola vez para todo el lote.
+Si el lote llega incompleto, con un hash inválido o con una ruta fuera de uploads/ se conservan los archivos
+ya guardados y se responde 409.'''
+@app.route("/upload_batch", methods=["POST"])
+def upload_batch():
+    saved = []
+    hashed = {}
+    error = None
+    try:
+        for header, data in read_frames(DecodedStream(request.stream, request.headers.get("Content-Encoding"))):
+            path = upload_path(header["path"])
+            if path is None:
+                raise ValueError(f"ruta inválida: {header['path']}")
+            save_bytes(data, path)
+            rel = rel_of(path)
+            saved.append(rel)
+            hashed[rel] = header["hash"]
+    except (ValueError, OSError) as e:
+        error = str(e)
+    if saved:
+        update_snapshot(hashed=hashed)
+    if error:
+        return jsonify({"saved": saved, "error": error}), 409
+    return jsonify({"saved": saved})
+
 @app.route("/download/<path:filename>", methods=["GET"]) #Permite descargar archivos desde el servidor
 def download_file(filename):
     safe_path = filename.replace("\\", "/")  
-    abs_path = os.path.join(UPLOAD_FOLDER, safe_path)
-    if not os.path.exists(abs_path):
+    abs_path = upload_path(safe_path)  # compressed_download no pasa por la revisión de send_from_directory
+    if abs_path is None or not abs_path.exists():
         return f"Archivo no encontrado: {safe_path}", 404
+    compressed = compressed_download(abs_path)
+    if compressed is not None:
+        return compressed
     directory = os.path.dirname(abs_path)
     file_name = os.path.basename(abs_path)
-    return send_from_directory(directory, file_name, as_attachment=True)
+    return send_from_directory(directory, file_name, as_attachment=True, conditional=True)  # conditional: responde Range (206) para retomar descargas
+
+'''Descarga por lotes: recibe {paths: [...]} y responde un stream de marcos con esos archivos. Los que
+ya no existen, quedan fuera de uploads/ o pasan de BATCH_MAX_FILE bytes (write_frames no los carga) se omiten;
+el cliente compara lo recibido con lo que pidió y los demás se descargan por separado en el siguiente ciclo.'''
+@app.route("/download_batch", methods=["POST"])
+def download_batch():
+    data = request.get_json(silent=True)
+    paths = data.get("paths") if isinstance(data, dict) else None
+    if not isinstance(paths, list):
+        return "Falta la lista de rutas", 400
+    files = [(rel, path) for rel, path in ((rel, upload_path(rel)) for rel in paths) if path is not None]
+    codec = pick_codec(request.headers.get("Accept-Encoding"))
+    if codec is None or all(already_compressed(rel) for rel, _ in files):
+        return Response(write_frames(files), mimetype="application/octet-stream")
+    response = Response(compress_blocks(write_frames(files), codec), mimetype="application/octet-stream")
+    response.headers["Content-Encoding"] = codec
+    return response
+
+@app.route("/snapshot", methods=["GET"]) #Devuelve .json de los archivos en el servidor
+def snapshot():
+    refresh_snapshot()
+    return jsonify(snap_index.snapshot())
+
+'''Devuelve solo los cambios del diario posteriores al cursor del cliente (?since=<seq>&epoch=<id>).
+Si el cursor no es válido o el diario ya se compactó más allá de él, devuelve el snapshot completo con reset=true.
+Con ?wait=<segundos> funciona como long-poll: si no hay cambios la petición espera a que la secuencia avance
+(hasta LONG_POLL_TIMEOUT) en lugar de que el cliente vuelva a preguntar. Mientras espera no se hashea nada;
+solo se revalida por stat cada RESCAN_INTERVAL para notar archivos copiados directo a uploads/.'''
+@app.route("/changes", methods=["GET"])
+def changes():
+    since = request.args.get("since", default=0, type=int)
+    epoch = request.args.get("epoch", default="")
+    wait = min(request.args.get("wait", default=0, type=float), LONG_POLL_TIMEOUT)
+    deadline = time.time() + wait
+    while True:
+        refresh_snapshot()
+        delta = snap_index.delta(since, epoch)
+        remaining = deadline - time.time()
+        if delta["reset"] or delta["changes"] or remaining <= 0:
+            return jsonify(delta)
+        snap_index.wait_for_change(since, min(remaining, snap_index.rescan_interval))
 
 '''Muestra todos los archivos del servidor. Utiliza fueza bruta os.walk recorre todas las carpetas para obtener las rutas y tamaños de 
 los archivos que se encuentran en el servidor y genera el .json asociado al servidor'''
@@ -76,19 +342,19 @@ def upload_web():
     file = request.files["file"]
     if file:
         save_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(save_path)
-        update_snapshot()
+        file_hash = save_upload(file, save_path)
+        update_snapshot(hashed={rel_of(save_path): file_hash})
     return redirect(url_for("index"))
 
 @app.route("/upload_folder", methods=["POST"]) #Sube carpetas desde la web y actualiza el snapshot.
 def upload_folder():
     files = request.files.getlist("files")
+    saved = {}
     for file in files:
         rel_path = file.filename.replace("\\", "/")  # Mantener estructura de carpetas
         save_path = os.path.join(UPLOAD_FOLDER, rel_path)
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        file.save(save_path)
-    update_snapshot()
+        saved[rel_of(save_path)] = save_upload(file, save_path)
+    update_snapshot(hashed=saved)
     return redirect(url_for("index"))
 
 @app.route("/delete/<path:filename>", methods=["GET", "DELETE"]) #Permite eliminar archivos desde la web y actualiza snapshot
@@ -101,16 +367,24 @@ def delete_file(filename):
         else:
             shutil.rmtree(file_path) 
 
-        update_snapshot()
+        update_snapshot(removed=[rel_of(file_path)])
         return "Deleted", 200
 
     return "Not Found", 404
 
-@app.route("/download_client") #Descarga el sincronizador desde la web.
+'''Descarga el sincronizador desde la web. El cliente importa varios módulos, así que se manda un .zip con el
+cliente y todos sus módulos en la misma carpeta, que es donde el cliente los busca.'''
+@app.route("/download_client")
 def download_client():
-    return send_from_directory(".", "client_sync.py", as_attachment=True)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path in CLIENT_FILES:
+            archive.write(path, os.path.basename(path))
+    buffer.seek(0)
+    return send_file(buffer, mimetype="application/zip", as_attachment=True, download_name="cliente_sync.zip")
 
 # ---------------- Main ----------------
 if __name__ == "__main__":
+    clean_partials()
     print("🚀 Servidor de sincronización ejecutándose en http://127.0.0.1:5000")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -1,3 +1,32 @@
+import os
+import mmap
+import zlib
+import heapq
+import struct
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 256 * 1024  # caracteres que se leen y codifican a la vez
+STREAM_BLOCK = 1024 * 1024  # bytes que se leen y escriben a la vez en el modo binario
+MAGIC = b"HUF1"
+HEADER = struct.Struct(">4sQQIII")  # firma, caracteres, bits, crc32, símbolos, bytes del alfabeto
+STREAM_MAGIC = b"HUFB"
+STREAM_HEADER = struct.Struct(">4sQQI")  # firma, bytes originales, bits, crc32; le siguen 256 longitudes
+MAX_CODE_LENGTH = 16  # longitud máxima de un código (si el alfabeto cabe); acota las tablas del decodificador
+STATE_DECODER_SYMBOLS = 256  # alfabetos más grandes se decodifican con la tabla por ventana de bits
+BLOCK_CHARS = 128 * 1024  # caracteres por bloque en el modo por bloques
+MAX_TABLES = 6  # tablas de códigos entre las que elige cada bloque
+TABLE_ITERATIONS = 4  # rondas de asignar bloques a tablas y recalcular las tablas
+BLOCK_MAGIC = b"HUFM"
+BLOCK_HEADER = struct.Struct(">4sQIIIHI")  # firma, caracteres, crc32, símbolos, bytes del alfabeto, tablas, bloques
+BLOCK_RECORD = struct.Struct(">BIQI")  # tabla, caracteres, bits y crc32 de un bloque; le siguen sus bytes empacados
+BLOCK_INDEX = struct.Struct(">QI")  # posición del registro de un bloque y sus caracteres originales
+BLOCK_WORKERS = min(4, os.cpu_count() or 1)  # procesos que comprimen o descomprimen bloques al mismo tiempo
+PARALLEL_MIN_CHARS = 4 * 1024 * 1024  # con menos caracteres los bloques se procesan en este proceso: arrancar el pool cuesta más de lo que ahorra
+
+workerTables = []  # tablas de códigos de la operación en curso, en cada proceso del pool
+workerDecoders = {}  # tablas de decodificación ya construidas en el proceso, por número de tabla
+
 class Node:
     def __init__(self, value, character):
         self.value = value
@@ -7,38 +36,37 @@ class Node:
         self.key = None
         self.keyLength = None
 
-def insertOrdered(node, list):
-    for i in range(len(list)):
-        if node.value < list[i].value:
-            list.insert(i, node)
-            return list
-    list.append(node)  
-    return list
-
-
+'''Construye el árbol con un montículo (heapq): en cada paso se sacan los dos nodos de menor frecuencia y se
+mete su padre, O(n log n) y sin recursión. El contador desempata nodos con la misma frecuencia en el
+orden en que se crearon, así el árbol siempre es el mismo para el mismo texto.'''
 def createTree(nodeList):
-    while (len(nodeList)>1):
-        root = Node(value=(nodeList[0].value+nodeList[1].value), character=None)
-        root.left = nodeList[0]
-        root.right = nodeList[1]
-        nodeList.pop(0)
-        nodeList.pop(0)
-        createTree(insertOrdered(root, nodeList))
-    return nodeList[0]
-
-def decodeByChar(route):
-
+    heap = [(node.value, order, node) for order, node in enumerate(nodeList)]
+    heapq.heapify(heap)
+    order = len(heap)
+    while len(heap) > 1:
+        leftValue, _, left = heapq.heappop(heap)
+        rightValue, _, right = heapq.heappop(heap)
+        root = Node(value=leftValue + rightValue, character=None)
+        root.left = left
+        root.right = right
+        heapq.heappush(heap, (root.value, order, root))
+        order += 1
+    return heap[0][2]
+
+def readChunks(route): #Lee el archivo de texto por partes de CHUNK_SIZE caracteres
     with open(route, "r", encoding="utf-8") as archive:
-        text = archive.read()
+        while True:
+            chunk = archive.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
 
+def decodeByChar(route):
     nodeList = []
-    counter = {}
+    counter = Counter()
 
-    for character in text:
-        if character in counter:
-            counter[character] += 1
-        else:
-            counter[character] = 1
+    for chunk in readChunks(route):
+        counter.update(chunk)
 
     for letter, times in counter.items():
         nodeList.append(Node(value=times, character=letter))
@@ -46,23 +74,30 @@ def decodeByChar(route):
     nodeList.sort(key=lambda n: n.value)
     return nodeList
 
-def createKeys(root, key=0, length=0):
-    if root is None:
-        return
-    root.key = key
-    root.keyLength = length
-    createKeys(root.left,  key << 1,     length + 1)
-    createKeys(root.right, (key << 1) | 1, length + 1)
+def createKeys(root, key=0, length=0): #Asigna a cada nodo su código y longitud recorriendo el árbol con una pila
+    stack = [(root, key, length)]
+    while stack:
+        node, key, length = stack.pop()
+        if node is None:
+            continue
+        node.key = key
+        node.keyLength = length
+        stack.append((node.right, (key << 1) | 1, length + 1))
+        stack.append((node.left, key << 1, length + 1))
     return root
 
-def createKeyList(root, keyList=[]):
-    if root is None:
-        return
-    if root.character is not None:
-        keyList.append(root)
-    createKeyList(root.left, keyList)
-    createKeyList(root.right, keyList)
-
+def createKeyList(root, keyList=None): #Hojas del árbol en preorden; sin lista se crea una nueva en cada llamada
+    if keyList is None:
+        keyList = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.character is not None:
+            keyList.append(node)
+        stack.append(node.right)
+        stack.append(node.left)
     return keyList
 
 '''def fillDict(node, codes=None):
@@ -81,77 +116,493 @@ def createKeyList(root, keyList=[]):
     fillDict(node.right, codes)
     return codes'''
 
-def concatenate(route, keyList):
-    myString = ""
-    with open(route, "r", encoding="utf-8") as archive:
-        text = archive.read()
-
-    codeMap = {}
-    for node in keyList:
-        codeMap[node.character] = (node.key, node.keyLength)
-
-    for character in text:
-        code, length = codeMap[character]
-        myString += format(code, f'0{length}b')
-
-    return myString
+def codeLengths(keyList): #Diccionario {carácter: longitud de su código}; un árbol de un solo carácter usa 1 bit
+    return {node.character: max(node.keyLength, 1) for node in keyList}
+
+'''Limita las longitudes de los códigos a maxLength (o a las necesarias para el tamaño del alfabeto) con el
+ajuste del anexo K de JPEG: por cada par de hojas más profundas que el límite, una sube un nivel y la otra
+se cuelga junto a una hoja más corta, que baja un nivel. Después los caracteres más frecuentes reciben
+las longitudes más cortas. El código sigue siendo completo, así que no se pierde nada al decodificar.'''
+def limitLengths(lengths, frequencies, maxLength=MAX_CODE_LENGTH):
+    maxLength = max(maxLength, (len(lengths) - 1).bit_length())
+    longest = max(lengths.values(), default=0)
+    if longest <= maxLength:
+        return lengths
+
+    counts = [0] * (longest + 1)  # counts[l]: cuántos códigos tienen longitud l
+    for length in lengths.values():
+        counts[length] += 1
+    for length in range(longest, maxLength, -1):
+        while counts[length] > 0:
+            shorter = length - 2
+            while counts[shorter] == 0:
+                shorter -= 1
+            counts[length] -= 2
+            counts[length - 1] += 1
+            counts[shorter + 1] += 2
+            counts[shorter] -= 1
+
+    limited = {}
+    length = 1
+    for character in sorted(lengths, key=lambda c: (-frequencies[c], lengths[c], c)):
+        while counts[length] == 0:
+            length += 1
+        counts[length] -= 1
+        limited[character] = length
+    return limited
+
+'''Códigos canónicos: solo dependen de la longitud de cada código. Los caracteres se ordenan por
+(longitud, carácter) y reciben códigos consecutivos, recorriendo a la izquierda cada vez que crece la longitud.
+Así basta guardar las longitudes para que cualquier proceso reconstruya los mismos códigos sin el árbol.
+Regresa {carácter: (código, longitud)}.'''
+def canonicalCodes(lengths):
+    codes = {}
+    code = 0
+    previous = 0
+    for character, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - previous
+        codes[character] = (code, length)
+        code += 1
+        previous = length
+    return codes
+
+'''Empaca texto por partes en lugar de concatenar un string por carácter: cada parte se traduce de una vez
+con str.translate a su cadena de bits, los bytes completos se empacan con int(..., 2).to_bytes y los bits
+sobrantes (menos de 8) se guardan para la siguiente parte. La memoria temporal queda limitada al tamaño
+de una parte y length lleva el número de bits empacados.'''
+class BitPacker:
+    def __init__(self, codes):
+        self.codeMap = {ord(character): format(code, f'0{length}b') for character, (code, length) in codes.items()}
+        self.carry = ""
+        self.length = 0
+
+    def pack(self, chunk): #Regresa los bytes completos de la parte
+        bits = self.carry + chunk.translate(self.codeMap)
+        full = len(bits) - len(bits) % 8
+        self.length += len(bits) - len(self.carry)
+        self.carry = bits[full:]
+        return int(bits[:full], 2).to_bytes(full // 8, "big") if full else b""
+
+    def flush(self): #Último byte con ceros de relleno, si quedaron bits
+        carry, self.carry = self.carry, ""
+        return int(carry.ljust(8, "0"), 2).to_bytes(1, "big") if carry else b""
+
+def packBits(route, codes): #Empaca un archivo de texto; regresa (número de bits, bytes empacados, crc32 del texto en UTF-8)
+    packer = BitPacker(codes)
+    packed = bytearray()
+    crc = 0
+    for chunk in readChunks(route):
+        crc = zlib.crc32(chunk.encode("utf-8"), crc)
+        packed += packer.pack(chunk)
+    packed += packer.flush()
+    return packer.length, packed, crc
+
+'''Contenedor autodescriptivo: encabezado HEADER (firma, número de caracteres, número de bits, crc32 del texto,
+número de símbolos y bytes del alfabeto), el alfabeto en UTF-8 en orden canónico, un byte con la longitud
+del código de cada símbolo y los bits empacados. Con eso cualquier proceso puede decodificar el archivo.'''
+def containerBytes(codes, characters, bitLength, crc, packed):
+    ordered = sorted(codes, key=lambda character: (codes[character][1], character))
+    alphabet = "".join(ordered).encode("utf-8")
+    lengths = bytes(codes[character][1] for character in ordered)
+    header = HEADER.pack(MAGIC, characters, bitLength, crc, len(ordered), len(alphabet))
+    return b"".join([header, alphabet, lengths, packed])
+
+def writeContainer(route, codes, characters, bitLength, crc, packed):
+    with open(route, "wb") as f:
+        f.write(containerBytes(codes, characters, bitLength, crc, packed))
+
+'''Separa un contenedor en memoria y regresa (longitudes {carácter: longitud}, caracteres, bits, crc32,
+bytes empacados). Si no tiene la firma o está incompleto lanza ValueError.'''
+def parseContainer(data):
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise ValueError("no es un archivo Huffman")
+    _, characters, bitLength, crc, symbols, alphabetSize = HEADER.unpack_from(data)
+    start = HEADER.size
+    alphabet = bytes(data[start:start + alphabetSize]).decode("utf-8")
+    lengths = data[start + alphabetSize:start + alphabetSize + symbols]
+    packed = data[start + alphabetSize + symbols:]
+    if len(alphabet) != symbols or len(lengths) != symbols or len(packed) != (bitLength + 7) // 8:
+        raise ValueError("archivo Huffman incompleto")
+    return dict(zip(alphabet, lengths)), characters, bitLength, crc, packed
+
+def readContainer(route):
+    with open(route, "rb") as f:
+        return parseContainer(f.read())
 
-def createCompressed(archive, route):
-    nodeList = decodeByChar(archive)
+def lengthsFor(nodeList): #Longitudes limitadas de los códigos para una lista de hojas; {} si no hay caracteres
+    if not nodeList:
+        return {}
     myTree = createTree(nodeList)
     myCodesTree = createKeys(myTree)
-    myCodes = createKeyList(myCodesTree)
-    myString = concatenate(archive, myCodes)
-
-    length = len(myString)
-    while len(myString) % 8 != 0:
-        myString += "0"
-    byteData = int(myString, 2).to_bytes(len(myString)//8, "big")
-
-    with open(route, "wb") as f:
-        f.write(length.to_bytes(4, "big"))  
-        f.write(byteData) 
-    return myCodes    
+    keyList = createKeyList(myCodesTree)
+    return limitLengths(codeLengths(keyList), {node.character: node.value for node in keyList})
 
-def descompressed(route):
+def createCompressed(archive, route):
+    nodeList = decodeByChar(archive)
+    characters = sum(node.value for node in nodeList)
+    myCodes = canonicalCodes(lengthsFor(nodeList))
+    bitLength, byteData, crc = packBits(archive, myCodes)
+    writeContainer(route, myCodes, characters, bitLength, crc, byteData)
+    return myCodes
+
+'''Comprime un texto que ya está en memoria y regresa el contenedor como bytes, sin pasar por archivos
+temporales. Empaca por partes de CHUNK_SIZE igual que createCompressed.'''
+def compressText(text):
+    counter = Counter(text)
+    nodeList = [Node(value=times, character=letter) for letter, times in counter.items()]
+    myCodes = canonicalCodes(lengthsFor(nodeList))
+    packer = BitPacker(myCodes)
+    packed = bytearray()
+    for start in range(0, len(text), CHUNK_SIZE):
+        packed += packer.pack(text[start:start + CHUNK_SIZE])
+    packed += packer.flush()
+    return containerBytes(myCodes, len(text), packer.length, zlib.crc32(text.encode("utf-8")), packed)
+
+def codeTable(codes): #Diccionario {(longitud, código): carácter} para el decodificador
+    return {(length, code): character for character, (code, length) in codes.items()}
+
+'''Construye el decodificador por bytes: cada estado es un prefijo de código incompleto (un nodo interno
+del árbol) y para cada estado y cada byte posible se precalcula el texto que sale al recorrer sus 8 bits y
+el estado en el que se termina. texts[estado + byte] es ese texto y nexts[estado + byte] el siguiente estado,
+ya multiplicado por 256 para sumarle el siguiente byte. Una transición a un prefijo que no existe deja None.
+nexts termina con un 0 extra: es el índice inicial, cuyo siguiente estado es la raíz.'''
+def buildDecoder(codes):
+    states = {(0, 0): 0}
+    for length, key in codes:
+        for i in range(1, length):
+            states.setdefault((i, key >> (length - i)), len(states))
+
+    texts = [None] * (len(states) * 256)
+    nexts = [0] * (len(states) * 256)
+    for (stateLength, stateKey), state in states.items():
+        for byte in range(256):
+            length, key, text = stateLength, stateKey, ""
+            for bit in range(7, -1, -1):
+                length += 1
+                key = (key << 1) | ((byte >> bit) & 1)
+                character = codes.get((length, key))
+                if character is not None:
+                    text += character
+                    length, key = 0, 0
+                elif (length, key) not in states:
+                    text = None
+                    break
+            if text is not None:
+                texts[state * 256 + byte] = text
+                nexts[state * 256 + byte] = states[(length, key)] * 256
+    nexts.append(0)
+    return states, texts, nexts
+
+'''Decodificador para alfabetos grandes, donde la tabla por estados tendría demasiadas filas. Como los códigos
+tienen longitud limitada, una tabla de 2**maxLength entradas indica para cada ventana de bits el carácter
+de su código y la longitud que se consume; las entradas de cada código se llenan con una sola asignación
+de rebanada. Los bits se leen de 4 en 4 bytes sobre un entero acumulador.'''
+def decodeWindow(data, length, codes):
+    maxLength = max(codeLength for codeLength, _ in codes)
+    table = [None] * (1 << maxLength)
+    for (codeLength, code), character in codes.items():
+        span = 1 << (maxLength - codeLength)
+        table[code * span:(code + 1) * span] = [(character, codeLength)] * span
+
+    data = bytes(data) + bytes(4)  # relleno para leer la última ventana completa
+    mask = (1 << maxLength) - 1
+    output = []
+    acc = 0
+    bits = 0
+    pos = 0
+    remaining = length
+    while remaining > 0:
+        if bits < maxLength:
+            acc = ((acc & ((1 << bits) - 1)) << 32) | int.from_bytes(data[pos:pos + 4], "big")
+            pos += 4
+            bits += 32
+        entry = table[(acc >> (bits - maxLength)) & mask]
+        if entry is None or entry[1] > remaining:
+            raise ValueError("datos comprimidos inválidos")
+        output.append(entry[0])
+        bits -= entry[1]
+        remaining -= entry[1]
+    return "".join(output)
+
+'''Decodifica los bytes empacados con la tabla de buildDecoder: una búsqueda por byte en lugar de un
+recorrido bit por bit del árbol, sin expandir los datos a un string de bits. Recibe los datos por partes
+(chunks) y genera el texto de cada parte; el estado del decodificador pasa de una parte a la siguiente.
+Todos los bytes menos el último se decodifican completos; del último solo se recorren los bits válidos
+(el resto es relleno). Si los datos no corresponden a los códigos o están incompletos lanza ValueError.
+decoder permite reutilizar una tabla ya construida con buildDecoder para los mismos códigos.'''
+def decodeChunks(chunks, length, codes, decoder=None):
+    if length == 0:
+        return
+    if len(codes) > STATE_DECODER_SYMBOLS:
+        yield decodeWindow(b"".join(chunks), length, codes)
+        return
+    states, texts, nexts = decoder or buildDecoder(codes)
+    fullBytes = (length - 1) // 8
+    index = len(nexts) - 1
+    seen = 0
+    last = None
+    for chunk in chunks:
+        take = max(0, min(len(chunk), fullBytes - seen))
+        if take:
+            try:
+                yield "".join([texts[index := nexts[index] + byte] for byte in chunk[:take]])
+            except TypeError:
+                raise ValueError("datos comprimidos inválidos")
+            seen += take
+        if take < len(chunk) and last is None:
+            last = chunk[take]
+    if last is None:
+        raise ValueError("datos comprimidos incompletos")
+
+    tail = []
+    prefixes = {state * 256: prefix for prefix, state in states.items()}
+    prefixLength, key = prefixes[nexts[index]]
+    for bit in range(length - fullBytes * 8):
+        prefixLength += 1
+        key = (key << 1) | ((last >> (7 - bit)) & 1)
+        character = codes.get((prefixLength, key))
+        if character is not None:
+            tail.append(character)
+            prefixLength, key = 0, 0
+    if prefixLength:
+        raise ValueError("datos comprimidos inválidos")
+    yield "".join(tail)
+
+def decodeBytes(data, length, codes, decoder=None): #Decodifica bytes empacados que ya están en memoria
+    return "".join(decodeChunks([data], length, codes, decoder))
+
+'''Descomprime un contenedor en memoria solo con su encabezado: reconstruye los códigos canónicos a partir
+de las longitudes, decodifica y verifica el número de caracteres y el crc32. Lanza ValueError si no coinciden.'''
+def decompressText(data):
+    if data[:len(BLOCK_MAGIC)] == BLOCK_MAGIC:
+        return decompressBlocks(data)
+    lengths, characters, bitLength, crc, packed = parseContainer(data)
+    text = decodeBytes(packed, bitLength, codeTable(canonicalCodes(lengths)))
+    if len(text) != characters or zlib.crc32(text.encode("utf-8")) != crc:
+        raise ValueError("el contenido no coincide con el crc32 del encabezado")
+    return text
+
+def decompress(route):
     with open(route, "rb") as f:
-        length = int.from_bytes(f.read(4), "big")
-        data = f.read()
-
-    bits = bin(int.from_bytes(data, "big"))[2:].zfill(len(data)*8)
-    bits = bits[:length] 
-    return bits
-    #print(bits) 
-
-def decode(archive, keyList, route):
-    myString = descompressed(archive)
-    # invertir diccionario
-    codeMap = {}
-    for node in keyList:
-        codeMap[node.character] = format(node.key, f'0{node.keyLength}b')
-    
-    #print(codeMap)
-
-    reverse = {code: char for char, code in codeMap.items()}
-    
-    current = ""
-    decoded = ""
-
-    for bit in myString:
-        current += bit
-        if current in reverse:
-            decoded += reverse[current]
-            current = ""   # reiniciar para seguir
-        #print(decoded)
-        #input("")
+        return decompressText(f.read())
+
+def decode(archive, route):
+    decoded = decompress(archive)
 
     with open(route, "w", encoding="utf-8") as f:
         f.write(decoded)
 
-
-
-
-
-
-
-        
\ No newline at end of file
+def readBlocks(stream, size, blockSize=STREAM_BLOCK): #Lee hasta size bytes de un stream en bloques de blockSize
+    while size > 0:
+        block = stream.read(min(blockSize, size))
+        if not block:
+            return
+        size -= len(block)
+        yield block
+
+'''Modo binario: comprime cualquier archivo como 256 símbolos (un byte cada uno) sin cargarlo a memoria.
+Primero recorre src por bloques para contar los bytes y calcular el crc32, con eso ya conoce los códigos y el
+número de bits y escribe el encabezado (STREAM_HEADER y 256 longitudes, 0 para los bytes que no aparecen);
+después regresa al inicio y empaca bloque por bloque. Cada bloque se decodifica como latin-1 para que
+cada byte sea un carácter y se use el mismo BitPacker del modo texto. src debe permitir seek; dst puede
+ser cualquier stream de escritura. Regresa el número de bytes originales.'''
+def compress_stream(src, dst, blockSize=STREAM_BLOCK):
+    start = src.tell()
+    counter = Counter()
+    crc = 0
+    size = 0
+    for block in iter(lambda: src.read(blockSize), b""):
+        counter.update(block)
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+
+    lengths = lengthsFor([Node(value=times, character=chr(byte)) for byte, times in counter.items()])
+    codes = canonicalCodes(lengths)
+    bitLength = sum(times * codes[chr(byte)][1] for byte, times in counter.items())
+    dst.write(STREAM_HEADER.pack(STREAM_MAGIC, size, bitLength, crc))
+    dst.write(bytes(lengths.get(chr(byte), 0) for byte in range(256)))
+
+    src.seek(start)
+    packer = BitPacker(codes)
+    for block in iter(lambda: src.read(blockSize), b""):
+        dst.write(packer.pack(block.decode("latin-1")))
+    dst.write(packer.flush())
+    return size
+
+'''Descomprime un stream del modo binario bloque por bloque: lee el encabezado, reconstruye los códigos
+canónicos y escribe en dst lo que sale de cada bloque, calculando el crc32 al mismo tiempo. Solo se
+guarda en memoria un bloque. Lanza ValueError si el stream no es de este formato, está incompleto o el
+contenido no coincide con el encabezado. Regresa el número de bytes escritos.'''
+def decompress_stream(src, dst, blockSize=STREAM_BLOCK):
+    header = src.read(STREAM_HEADER.size)
+    if len(header) < STREAM_HEADER.size or header[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+        raise ValueError("no es un stream Huffman")
+    _, size, bitLength, crc = STREAM_HEADER.unpack(header)
+    table = src.read(256)
+    if len(table) < 256:
+        raise ValueError("stream Huffman incompleto")
+    codes = canonicalCodes({chr(byte): length for byte, length in enumerate(table) if length})
+
+    written = 0
+    check = 0
+    blocks = readBlocks(src, (bitLength + 7) // 8, blockSize)
+    for piece in decodeChunks(blocks, bitLength, codeTable(codes)):
+        data = piece.encode("latin-1")
+        dst.write(data)
+        check = zlib.crc32(data, check)
+        written += len(data)
+    if written != size or check != crc:
+        raise ValueError("el contenido no coincide con el crc32 del encabezado")
+    return written
+
+
+def blockCost(counter, lengths): #Bits que ocuparía un bloque con las longitudes de una tabla
+    return sum(times * lengths[character] for character, times in counter.items())
+
+'''Elige las tablas del modo por bloques como bzip2: empieza repartiendo los bloques en grupos contiguos
+(uno por tabla) y en cada ronda construye las longitudes de cada tabla con las frecuencias de sus bloques
+y pasa cada bloque a la tabla con la que ocupa menos bits. Todas las tablas cubren el alfabeto completo
+(cada carácter cuenta al menos una vez), así cualquier bloque puede usar cualquier tabla. Las tablas que
+se quedan sin bloques se descartan. Regresa (lista de longitudes {carácter: longitud}, tabla de cada bloque).'''
+def chooseTables(counters, alphabet, maxTables=MAX_TABLES, iterations=TABLE_ITERATIONS):
+    tableCount = max(1, min(maxTables, len(counters)))
+    assignment = [i * tableCount // max(len(counters), 1) for i in range(len(counters))]
+    tables = []
+    for _ in range(iterations):
+        totals = [Counter(dict.fromkeys(alphabet, 1)) for _ in range(tableCount)]
+        for counter, table in zip(counters, assignment):
+            totals[table].update(counter)
+        tables = [lengthsFor([Node(value=times, character=letter) for letter, times in total.items()]) for total in totals]
+        changed = False
+        for i, counter in enumerate(counters):
+            best = min(range(tableCount), key=lambda table: blockCost(counter, tables[table]))
+            if best != assignment[i]:
+                assignment[i] = best
+                changed = True
+        if not changed:
+            break
+
+    used = sorted(set(assignment))
+    renumber = {table: n for n, table in enumerate(used)}
+    return [tables[table] for table in used], [renumber[table] for table in assignment]
+
+def initWorker(tables): #Recibe las tablas una sola vez por proceso en lugar de una vez por bloque
+    global workerTables, workerDecoders
+    workerTables = tables
+    workerDecoders = {}
+
+def encodeBlock(task): #Empaca (bloque, tabla) y regresa su registro BLOCK_RECORD seguido de los bytes empacados
+    block, table = task
+    packer = BitPacker(workerTables[table])
+    packed = packer.pack(block) + packer.flush()
+    return BLOCK_RECORD.pack(table, len(block), packer.length, zlib.crc32(block.encode("utf-8"))) + packed
+
+def decodeTask(block): #Decodifica un bloque reutilizando la tabla de decodificación de su tabla de códigos
+    codes = workerTables[block[0]]
+    if block[0] not in workerDecoders and len(codes) <= STATE_DECODER_SYMBOLS:
+        workerDecoders[block[0]] = buildDecoder(codes)
+    return decodeBlock(block, codes, workerDecoders.get(block[0]))
+
+'''Ejecuta las tareas de bloques en un ProcessPoolExecutor: cada bloque es independiente, así que se reparten
+entre workers procesos sin compartir estado y los resultados regresan en el mismo orden. Las tablas se
+mandan una vez a cada proceso con initWorker. Con un solo proceso, una sola tarea o menos de PARALLEL_MIN_CHARS
+caracteres en total se ejecutan aquí mismo: un bloque de 128 K caracteres se codifica en ~25 ms y crear el pool y
+mandarle las tablas cuesta ~15 ms por proceso con fork y varios cientos de ms con spawn (Windows).'''
+def runTasks(func, tasks, tables, workers, chars):
+    if workers > 1 and len(tasks) > 1 and chars >= PARALLEL_MIN_CHARS:
+        workers = min(workers, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(tables,)) as pool:
+            return list(pool.map(func, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    initWorker(tables)
+    return [func(task) for task in tasks]
+
+'''Modo por bloques: divide el texto en bloques de blockSize caracteres y cada bloque usa la tabla canónica
+(de hasta maxTables) con la que ocupa menos bits, así las partes del archivo con estadísticas distintas
+usan códigos distintos. Cada bloque se empaca por separado (en paralelo con workers procesos), empieza en
+un byte nuevo y lleva su tabla, caracteres, bits y crc32 (BLOCK_RECORD), de modo que se puede decodificar
+sin los bloques anteriores. El encabezado (BLOCK_HEADER) guarda el alfabeto una sola vez, las longitudes
+de cada tabla y un índice con la posición y los caracteres de cada bloque (BLOCK_INDEX) para leer el
+bloque k directamente.'''
+def compressBlocks(text, blockSize=BLOCK_CHARS, maxTables=MAX_TABLES, workers=BLOCK_WORKERS):
+    blocks = [text[start:start + blockSize] for start in range(0, len(text), blockSize)]
+    counters = [Counter(block) for block in blocks]
+    alphabet = sorted(set().union(*counters))
+    tables, assignment = chooseTables(counters, alphabet, maxTables) if blocks else ([], [])
+    tableCodes = [canonicalCodes(lengths) for lengths in tables]
+    records = runTasks(encodeBlock, list(zip(blocks, assignment)), tableCodes, workers, len(text))
+
+    alphabetBytes = "".join(alphabet).encode("utf-8")
+    parts = [BLOCK_HEADER.pack(BLOCK_MAGIC, len(text), zlib.crc32(text.encode("utf-8")), len(alphabet),
+                               len(alphabetBytes), len(tables), len(blocks)), alphabetBytes]
+    parts.extend(bytes(lengths[character] for character in alphabet) for lengths in tables)
+    offset = sum(map(len, parts)) + BLOCK_INDEX.size * len(blocks)
+    for block, record in zip(blocks, records):
+        parts.append(BLOCK_INDEX.pack(offset, len(block)))
+        offset += len(record)
+    parts.extend(records)
+    return b"".join(parts)
+
+'''Lee el encabezado del modo por bloques y regresa (caracteres, crc32, códigos de cada tabla, índice), donde
+el índice es la lista [(posición del registro, caracteres)] de cada bloque. No lee los bloques, así que
+sirve para ir directo a uno. Si el contenedor no es de este modo o está incompleto lanza ValueError.'''
+def parseBlocks(data):
+    if len(data) < BLOCK_HEADER.size or data[:len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+        raise ValueError("no es un archivo Huffman por bloques")
+    _, characters, crc, symbols, alphabetSize, tableCount, blockCount = BLOCK_HEADER.unpack_from(data)
+    pos = BLOCK_HEADER.size
+    alphabet = bytes(data[pos:pos + alphabetSize]).decode("utf-8")
+    pos += alphabetSize
+    if len(alphabet) != symbols:
+        raise ValueError("archivo Huffman incompleto")
+    tables = []
+    for _ in range(tableCount):
+        lengths = data[pos:pos + symbols]
+        if len(lengths) != symbols or not all(lengths):
+            raise ValueError("archivo Huffman incompleto")
+        tables.append(canonicalCodes(dict(zip(alphabet, lengths))))
+        pos += symbols
+    if pos + BLOCK_INDEX.size * blockCount > len(data):
+        raise ValueError("archivo Huffman incompleto")
+    index = [BLOCK_INDEX.unpack_from(data, pos + i * BLOCK_INDEX.size) for i in range(blockCount)]
+    return characters, crc, tables, index
+
+def blockAt(data, offset, tableCount): #Registro del bloque que empieza en offset: (tabla, caracteres, bits, crc32, bytes empacados)
+    if offset + BLOCK_RECORD.size > len(data):
+        raise ValueError("archivo Huffman incompleto")
+    table, blockChars, bitLength, blockCrc = BLOCK_RECORD.unpack_from(data, offset)
+    start = offset + BLOCK_RECORD.size
+    end = start + (bitLength + 7) // 8
+    if table >= tableCount or end > len(data):
+        raise ValueError("archivo Huffman incompleto")
+    return table, blockChars, bitLength, blockCrc, bytes(data[start:end])
+
+def decodeBlock(block, codes, decoder=None): #Decodifica un bloque independiente y verifica sus caracteres y crc32
+    _, blockChars, bitLength, blockCrc, packed = block
+    text = decodeBytes(packed, bitLength, codes, decoder)
+    if len(text) != blockChars or zlib.crc32(text.encode("utf-8")) != blockCrc:
+        raise ValueError("el bloque no coincide con su crc32")
+    return text
+
+'''Descomprime un contenedor del modo por bloques, repartiendo los bloques entre workers procesos. En cada
+proceso la tabla de decodificación de cada tabla de códigos se construye una sola vez y se reutiliza.'''
+def decompressBlocks(data, workers=BLOCK_WORKERS):
+    characters, crc, tables, index = parseBlocks(data)
+    blocks = [blockAt(data, offset, len(tables)) for offset, _ in index]
+    text = "".join(runTasks(decodeTask, blocks, [codeTable(codes) for codes in tables], workers, characters))
+    if len(text) != characters or zlib.crc32(text.encode("utf-8")) != crc:
+        raise ValueError("el contenido no coincide con el crc32 del encabezado")
+    return text
+
+def decompressBlock(data, k): #Decodifica solo el bloque k con el índice, sin decodificar los anteriores
+    characters, crc, tables, index = parseBlocks(data)
+    if not 0 <= k < len(index):
+        raise IndexError(f"el contenedor tiene {len(index)} bloques")
+    block = blockAt(data, index[k][0], len(tables))
+    return decodeBlock(block, codeTable(tables[block[0]]))
+
+'''Lee el bloque k de un archivo del modo por bloques. El archivo se mapea con mmap, así que solo se leen
+del disco el encabezado, el índice y los bytes de ese bloque.'''
+def readBlock(route, k):
+    with open(route, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decompressBlock(data, k)
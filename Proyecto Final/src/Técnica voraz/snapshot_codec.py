@@ -0,0 +1,443 @@
+'''Formato binario de los snapshots de la versión voraz (snapshot.bin del servidor y .snapshot_local.bin del cliente).
+El cuerpo de cada página se comprime según COMPRESSION. El valor por omisión es ZLIB y no HUFFMAN por una medición
+con 100 000 entradas: con huffman.compress_stream el índice del servidor ocupa 16% más (4.4 MB contra 3.8 MB) y el
+del cliente 22% más, codificar tarda 3-4 veces más y decodificarlo completo pasa de 0.2-0.5 s a 175-235 s, porque
+cada página arma su propio decodificador. Los hashes son bytes aleatorios y solo las rutas se repiten, así que zlib
+aprovecha mejor el cuerpo que un código de Huffman byte a byte. Para usar Huffman basta con COMPRESSION = HUFFMAN
+(o compression=HUFFMAN en encode_snapshot/encode_index); cada archivo guarda su compresión en el encabezado, así que
+los .bin con cualquiera de las dos se siguen leyendo.'''
+import io
+import json
+import mmap
+import zlib
+import struct
+from bisect import bisect_right
+from collections.abc import Mapping
+import huffman
+
+MAGIC = b"SNP1"
+HEADER = struct.Struct(">4sBI")  # firma, compresión del cuerpo, crc32 del cuerpo sin comprimir
+RAW, ZLIB, HUFFMAN = 0, 1, 2  # compresión que se aplica al cuerpo ya codificado
+COMPRESSION = ZLIB  # bandera: ZLIB (medido más chico y rápido, ver arriba) o HUFFMAN
+ZLIB_LEVEL = 6
+MAX_PATH = 0xFFFF  # el prefijo compartido se guarda en 2 bytes
+INDEX_MAGIC = b"SNX1"
+INDEX_HEADER = struct.Struct(">4sIII")  # firma, entradas, páginas, bytes de las primeras rutas
+PAGE_ENTRIES = 128  # entradas por página del índice; una búsqueda decodifica solo su página
+
+# Banderas de cada entrada (1 byte)
+PLAIN = 1  # el valor es solo el hash, como en el snapshot del servidor {ruta: hash}
+HASH = 2  # sha256 guardado como 32 bytes en lugar de 64 caracteres hexadecimales
+FILE = 4  # "type": "file"
+DIR = 8  # "type": "dir"
+STAT = 16  # size, mtime_ns, ino y racy
+RACY = 32  # racy es True
+CHUNKS = 64  # lista de bloques [[sha256, tamaño], ...]
+EXTRA = 128  # lo que no cabe en los campos anteriores, como JSON
+
+
+def put_varint(out, n): #Agrega un entero no negativo en LEB128: 7 bits por byte, el bit alto indica que sigue otro byte
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+def put_signed(out, n): #Agrega un entero con signo en zigzag (0, -1, 1, -2, ...) para que las diferencias chicas ocupen poco
+    put_varint(out, n * 2 if n >= 0 else -n * 2 - 1)
+
+def read_varint(data, pos): #Regresa (entero, posición siguiente)
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def read_varints(data): #Decodifica todos los varints de data en una lista
+    values = []
+    n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(n)
+            n = shift = 0
+    if shift:
+        raise ValueError("varint incompleto")
+    return values
+
+def unzigzag(n):
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+def digest_of(value): #Los 32 bytes de un sha256 en hexadecimal (minúsculas), o None si value no lo es
+    if not isinstance(value, str) or len(value) != 64:
+        return None
+    try:
+        raw = bytes.fromhex(value)
+    except ValueError:
+        return None
+    return raw if raw.hex() == value else None
+
+def shared_prefix(a, b): #Caracteres iniciales que comparten a y b; busca el largo con bisección comparando rebanadas
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def is_count(value):
+    return type(value) is int and value >= 0
+
+def is_chunk_list(value): #True si value es [[sha256, tamaño], ...] y se puede guardar en binario
+    return isinstance(value, list) and all(
+        isinstance(chunk, list) and len(chunk) == 2 and digest_of(chunk[0]) is not None and is_count(chunk[1])
+        for chunk in value)
+
+
+'''Codifica un snapshot (del servidor {ruta: hash} o del cliente {ruta: {type, size, mtime_ns, ino, hash, racy, chunks}})
+en un formato binario por columnas. Las rutas van ordenadas y con front coding: cada una guarda solo cuántos caracteres
+comparte con la anterior y el resto, así las carpetas repetidas se escriben una vez. Los hashes van como 32 bytes,
+los tamaños como varints y mtime_ns e inodo como diferencias con la entrada anterior, que suelen ser chicas.
+Cualquier campo que no tenga la forma esperada se guarda como JSON, así que la conversión nunca pierde datos.
+Después el cuerpo se comprime con zlib (o huffman) y se le antepone el encabezado HEADER.'''
+def encode_snapshot(snapshot, compression=COMPRESSION):
+    flags = bytearray()
+    shared = []
+    suffixes = []
+    digests = bytearray()
+    numbers = bytearray()
+    extras = bytearray()
+    prev = ""
+    mtime = ino = 0
+    for rel in sorted(snapshot):
+        if "\0" in rel or len(rel) > MAX_PATH:
+            raise ValueError(f"ruta inválida en el snapshot: {rel!r}")
+        common = shared_prefix(prev, rel)
+        shared.append(common)
+        suffixes.append(rel[common:])
+        prev = rel
+        value = snapshot[rel]
+        flag = 0
+        rest = None
+        if not isinstance(value, dict):
+            flag = PLAIN
+            digest = digest_of(value)
+            if digest is not None:
+                flag |= HASH
+                digests += digest
+            else:
+                rest = value
+        else:
+            rest = dict(value)
+            kind = rest.get("type")
+            if kind == "file" or kind == "dir":
+                flag |= FILE if kind == "file" else DIR
+                del rest["type"]
+            digest = digest_of(rest.get("hash"))
+            if digest is not None:
+                flag |= HASH
+                digests += digest
+                del rest["hash"]
+            if (is_count(rest.get("size")) and type(rest.get("mtime_ns")) is int and type(rest.get("ino")) is int
+                    and type(rest.get("racy")) is bool):
+                flag |= STAT | (RACY if rest["racy"] else 0)
+                put_varint(numbers, rest.pop("size"))
+                put_signed(numbers, rest["mtime_ns"] - mtime)
+                put_signed(numbers, rest["ino"] - ino)
+                mtime = rest.pop("mtime_ns")
+                ino = rest.pop("ino")
+                del rest["racy"]
+            if is_chunk_list(rest.get("chunks")):
+                flag |= CHUNKS
+                chunks = rest.pop("chunks")
+                put_varint(numbers, len(chunks))
+                for chunk_hash, length in chunks:
+                    digests += bytes.fromhex(chunk_hash)
+                    put_varint(numbers, length)
+            if not rest:
+                rest = None
+        if rest is not None:
+            flag |= EXTRA
+            encoded = json.dumps(rest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            put_varint(numbers, len(encoded))
+            extras += encoded
+        flags.append(flag)
+    paths = "\0".join(suffixes).encode("utf-8")
+    body = bytearray()
+    for size in (len(flags), len(paths), len(digests), len(numbers), len(extras)):
+        put_varint(body, size)
+    body += flags
+    body += struct.pack(f">{len(shared)}H", *shared)
+    body += paths
+    body += digests
+    body += numbers
+    body += extras
+    return HEADER.pack(MAGIC, compression, zlib.crc32(body)) + compress_body(bytes(body), compression)
+
+def compress_body(body, compression):
+    if compression == ZLIB:
+        return zlib.compress(body, ZLIB_LEVEL)
+    if compression == HUFFMAN:
+        dst = io.BytesIO()
+        huffman.compress_stream(io.BytesIO(body), dst)
+        return dst.getvalue()
+    if compression == RAW:
+        return body
+    raise ValueError(f"compresión desconocida: {compression}")
+
+def decompress_body(data, compression):
+    if compression == ZLIB:
+        try:
+            return zlib.decompress(data)
+        except zlib.error as e:
+            raise ValueError(f"snapshot dañado: {e}")
+    if compression == HUFFMAN:
+        dst = io.BytesIO()
+        huffman.decompress_stream(io.BytesIO(data), dst)
+        return dst.getvalue()
+    if compression == RAW:
+        return data
+    raise ValueError(f"compresión desconocida: {compression}")
+
+
+'''Decodifica los bytes de encode_snapshot y regresa el mismo diccionario. Las columnas se convierten de una sola vez
+(hashes a hexadecimal, prefijos con struct, rutas con split) y el ciclo por entrada solo arma las rutas y los valores.
+También lee los índices de encode_index completos y los .bin del formato anterior (JSON comprimido con
+huffman.compressText). Si los datos están incompletos o dañados lanza ValueError.'''
+def decode_snapshot(data):
+    if data[:4] == INDEX_MAGIC:
+        return decode_index(data)
+    if data[:4] != MAGIC:
+        return json.loads(huffman.decompressText(data))  # formato anterior
+    try:
+        return decode_body(unpack_body(data))
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"snapshot dañado: {e}")
+
+def unpack_body(data): #Cuerpo sin comprimir de un snapshot de encode_snapshot; lanza ValueError si está incompleto o no coincide su crc32
+    if len(data) < HEADER.size:
+        raise ValueError("snapshot incompleto")
+    magic, compression, crc = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("firma de snapshot inválida")
+    body = decompress_body(data[HEADER.size:], compression)
+    if zlib.crc32(body) != crc:
+        raise ValueError("el crc32 del snapshot no coincide")
+    return body
+
+def decode_body(body):
+    pos = 0
+    sizes = []
+    for _ in range(5):
+        size, pos = read_varint(body, pos)
+        sizes.append(size)
+    count, paths_size, digests_size, numbers_size, extras_size = sizes
+    flags = body[pos:pos + count]
+    pos += count
+    shared = struct.unpack_from(f">{count}H", body, pos)
+    pos += 2 * count
+    suffixes = body[pos:pos + paths_size].decode("utf-8").split("\0")
+    pos += paths_size
+    hexes = body[pos:pos + digests_size].hex()
+    pos += digests_size
+    numbers = read_varints(body[pos:pos + numbers_size])
+    pos += numbers_size
+    extras = body[pos:pos + extras_size]
+    if pos + extras_size != len(body) or len(flags) != count or (count and len(suffixes) != count):
+        raise ValueError("snapshot dañado: las columnas no coinciden")
+    snapshot = {}
+    prev = ""
+    d = n = e = 0  # posiciones en hexes, numbers y extras
+    mtime = ino = 0
+    for i in range(count):
+        rel = prev[:shared[i]] + suffixes[i]
+        prev = rel
+        flag = flags[i]
+        if flag == PLAIN | HASH:  # caso común del snapshot del servidor
+            snapshot[rel] = hexes[d:d + 64]
+            d += 64
+            continue
+        value = None if flag & PLAIN else {}
+        if flag & FILE:
+            value["type"] = "file"
+        elif flag & DIR:
+            value["type"] = "dir"
+        if flag & HASH:
+            if flag & PLAIN:
+                value = hexes[d:d + 64]
+            else:
+                value["hash"] = hexes[d:d + 64]
+            d += 64
+        if flag & STAT:
+            mtime += unzigzag(numbers[n + 1])
+            ino += unzigzag(numbers[n + 2])
+            value["size"] = numbers[n]
+            value["mtime_ns"] = mtime
+            value["ino"] = ino
+            value["racy"] = bool(flag & RACY)
+            n += 3
+        if flag & CHUNKS:
+            chunks = []
+            for _ in range(numbers[n]):
+                n += 1
+                chunks.append([hexes[d:d + 64], numbers[n]])
+                d += 64
+            value["chunks"] = chunks
+            n += 1
+        if flag & EXTRA:
+            rest = json.loads(extras[e:e + numbers[n]])
+            e += numbers[n]
+            n += 1
+            if flag & PLAIN:
+                value = rest
+            else:
+                value.update(rest)
+        snapshot[rel] = value
+    if d != len(hexes) or n != len(numbers) or e != len(extras):
+        raise ValueError("snapshot dañado: sobran datos en las columnas")
+    return snapshot
+
+
+'''Codifica un snapshot como índice que se puede consultar sin cargarlo: las rutas ordenadas se parten en páginas
+de page_entries entradas y cada página es un snapshot independiente de encode_snapshot. Antes de las páginas van sus
+posiciones (8 bytes por página más el final del archivo) y la primera ruta de cada una, que es lo único que se busca
+con bisección para saber en qué página está una ruta.'''
+def encode_index(snapshot, page_entries=PAGE_ENTRIES, compression=COMPRESSION):
+    rels = sorted(snapshot)
+    starts = range(0, len(rels), page_entries)
+    pages = [encode_snapshot({rel: snapshot[rel] for rel in rels[i:i + page_entries]}, compression) for i in starts]
+    firsts = [rels[i].encode("utf-8") for i in starts]
+    keys = b"".join(firsts)
+    offset = INDEX_HEADER.size + 8 * (len(pages) + 1) + 2 * len(pages) + len(keys)
+    offsets = []
+    for page in pages:
+        offsets.append(offset)
+        offset += len(page)
+    offsets.append(offset)
+    return b"".join([INDEX_HEADER.pack(INDEX_MAGIC, len(rels), len(pages), len(keys)),
+                     struct.pack(f">{len(offsets)}Q", *offsets),
+                     struct.pack(f">{len(firsts)}H", *map(len, firsts)),
+                     keys, *pages])
+
+def read_index_header(data): #Regresa (entradas, posiciones de las páginas, primera ruta de cada página)
+    if len(data) < INDEX_HEADER.size:
+        raise ValueError("índice de snapshot incompleto")
+    magic, entries, pages, keys_size = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC:
+        raise ValueError("no es un índice de snapshot")
+    pos = INDEX_HEADER.size
+    try:
+        offsets = struct.unpack_from(f">{pages + 1}Q", data, pos)
+        pos += 8 * (pages + 1)
+        lengths = struct.unpack_from(f">{pages}H", data, pos)
+        pos += 2 * pages
+    except struct.error:
+        raise ValueError("índice de snapshot incompleto")
+    keys = data[pos:pos + keys_size]
+    firsts = []
+    pos = 0
+    for length in lengths:
+        firsts.append(keys[pos:pos + length].decode("utf-8"))
+        pos += length
+    if pos != keys_size or len(keys) != keys_size or offsets[-1] != len(data):
+        raise ValueError("índice de snapshot incompleto")
+    return entries, offsets, firsts
+
+def decode_index(data): #Decodifica el índice completo, página por página
+    _, offsets, _ = read_index_header(data)
+    snapshot = {}
+    for start, end in zip(offsets, offsets[1:]):
+        snapshot.update(decode_snapshot(data[start:end]))
+    return snapshot
+
+
+'''Índice de encode_index abierto con mmap: se usa como un diccionario de solo lectura sin decodificar el archivo.
+Al abrirlo solo se leen las posiciones y las primeras rutas de las páginas; cada búsqueda hace bisección sobre esas
+rutas y decodifica una sola página. La última página decodificada se conserva, así que buscar o recorrer rutas en
+orden decodifica cada página una vez. Hay que cerrarlo (o usarlo con with) antes de reemplazar el archivo, porque en
+Windows no se puede reemplazar un archivo mapeado.'''
+class SnapshotFile(Mapping):
+    def __init__(self, path):
+        self.data = None
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.entries, self.offsets, self.firsts = read_index_header(self.data)
+        except (OSError, ValueError):  # mmap de un archivo vacío también lanza ValueError
+            self.close()
+            raise
+        self.cached = (-1, {})  # (número de página, página decodificada); se reemplaza de una sola vez entre hilos
+
+    def _page(self, k):
+        number, page = self.cached
+        if number != k:
+            page = decode_snapshot(self.data[self.offsets[k]:self.offsets[k + 1]])
+            self.cached = (k, page)
+        return page
+
+    def __getitem__(self, rel):
+        k = bisect_right(self.firsts, rel) - 1
+        if k < 0:
+            raise KeyError(rel)
+        return self._page(k)[rel]
+
+    def __iter__(self):
+        for k in range(len(self.firsts)):
+            yield from self._page(k)
+
+    def __len__(self):
+        return self.entries
+
+    def scan(self, prefix=""): #Entradas (ruta, valor) en orden cuyas rutas empiezan con prefix, desde su página
+        first = max(bisect_right(self.firsts, prefix) - 1, 0)
+        for k in range(first, len(self.firsts)):
+            for rel, value in self._page(k).items():
+                if rel.startswith(prefix):
+                    yield rel, value
+                elif rel > prefix:
+                    return
+
+    def verify(self): #Revisa el crc32 de todas las páginas sin armar sus diccionarios; lanza ValueError si alguna está dañada
+        for k in range(len(self.firsts)):
+            unpack_body(self.data[self.offsets[k]:self.offsets[k + 1]])
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''Compara dos snapshots recorriéndolos en orden al mismo tiempo, como la mezcla de merge sort, y regresa
+(ruta, valor anterior, valor nuevo) por cada ruta distinta; None indica que la ruta no está de ese lado. Recibe iterables
+de (ruta, valor) ordenados por ruta, como SnapshotFile.scan() o sorted(snapshot.items()), así que dos índices se
+comparan sin cargar ninguno completo.'''
+def diff_snapshots(old, new):
+    old = iter(old)
+    new = iter(new)
+    a = next(old, None)
+    b = next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield a[0], a[1], None
+            a = next(old, None)
+        elif a is None or b[0] < a[0]:
+            yield b[0], None, b[1]
+            b = next(new, None)
+        else:
+            if a[1] != b[1]:
+                yield a[0], a[1], b[1]
+            a = next(old, None)
+            b = next(new, None)
@@ -1,7 +1,7 @@
 import os
+import sys
 import threading
 import time
-import hashlib
 import json
 import shutil
 import random
@@ -10,26 +10,22 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
+# Módulo de hash compartido con los sincronizadores del proyecto final
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Proyecto Final", "src", "Compartido"))
+import hashing
+
 # ---------------------- Configuration ----------------------
 DEFAULT_LOCAL = Path("local_root")
 DEFAULT_REMOTE = Path("remote_root")
 SNAPSHOT_FILE = Path(".sync_snapshot_gui.json")
 POLL_INTERVAL_DEFAULT = 5  # seconds
-HASH_BLOCK = 4 * 1024 * 1024
 
 # ---------------------- Utilities ----------------------
-#Calcula el hash por bloques
-def calc_sha256(path: Path, block_size=HASH_BLOCK):
-    h = hashlib.sha256()
+#Calcula el hash con el módulo compartido (bloque adaptativo, readinto o mmap); None si no se puede leer
+def calc_sha256(path: Path):
     try:
-        with open(path, "rb") as f:
-            while True:
-                b = f.read(block_size)
-                if not b:
-                    break
-                h.update(b)
-        return h.hexdigest()
-    except Exception:
+        return hashing.calc_sha256(path)
+    except OSError:
         return None
 
 #Ruta relativa